@@ -0,0 +1,83 @@
+"""
+Measures the startup cost of importing torchreid.
+
+Each case runs in a fresh interpreter and reports the median wall time of
+the import statement, the number of modules it loaded and the peak resident
+memory of the process. "eager" reproduces the old behaviour of importing
+every subpackage and architecture module.
+
+"torchreid.inference" also builds osnet_x0_25. Timings depend on the
+machine and vary between runs, so compare cases within one run.
+
+How to use:
+$ python tools/benchmark_import.py --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import os.path as osp
+import numpy as np
+
+REID_ROOT = osp.dirname(osp.dirname(osp.abspath(__file__)))
+
+CASES = {
+    'eager': (
+        'import importlib, torchreid\n'
+        'for m in torchreid.__submodules:\n'
+        '    importlib.import_module("torchreid." + m)\n'
+        'for m in torchreid.models.__model_modules:\n'
+        '    importlib.import_module("torchreid.models." + m)\n'
+    ),
+    'torchreid.utils': 'from torchreid.utils import FeatureExtractor\n',
+    'torchreid.inference': (
+        'from torchreid.inference import FeatureExtractor, build_model\n'
+        'build_model("osnet_x0_25", 1, pretrained=False, use_gpu=False)\n'
+    ),
+}
+
+PROBE = '''
+import sys, time, json, resource
+import torch, torchvision  # shared by every case, excluded from the timing
+n = len(sys.modules)
+t = time.perf_counter()
+{code}
+t = time.perf_counter() - t
+print(json.dumps({{
+    'time': t,
+    'modules': len(sys.modules) - n,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+}}))
+'''
+
+
+def run_case(code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [REID_ROOT, env.get('PYTHONPATH', '')]
+    )
+    out = subprocess.check_output(
+        [sys.executable, '-c', PROBE.format(code=code)], env=env
+    )
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print('{:<22}{:>12}{:>10}{:>12}'.format('case', 'time (ms)', 'modules', 'rss (MB)'))
+    for name, code in CASES.items():
+        results = [run_case(code) for _ in range(args.runs)]
+        print(
+            '{:<22}{:>12.1f}{:>10d}{:>12.1f}'.format(
+                name, 1000 * np.median([r['time'] for r in results]),
+                results[0]['modules'], np.median([r['rss_mb'] for r in results])
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
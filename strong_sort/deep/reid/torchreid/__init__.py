@@ -1,9 +1,21 @@
 from __future__ import print_function, absolute_import
 
-from torchreid import data, optim, utils, engine, losses, models, metrics
+import importlib
+
+# Subpackages are imported on first access (``torchreid.data``, ...), so that
+# inference code (``torchreid.inference``) never loads the training stack.
+__submodules = ('data', 'optim', 'utils', 'engine', 'losses', 'models', 'metrics')
 
 __version__ = '1.4.0'
 __author__ = 'Kaiyang Zhou'
 __homepage__ = 'https://kaiyangzhou.github.io/'
 __description__ = 'Deep learning person re-identification in PyTorch'
 __url__ = 'https://github.com/KaiyangZhou/deep-person-reid'
+
+
+def __getattr__(name):
+    if name in __submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name)
+    )
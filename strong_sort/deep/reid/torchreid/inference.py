@@ -0,0 +1,23 @@
+"""Inference-only entry point.
+
+Importing ``torchreid.inference`` loads the feature extractor and the model
+registry only; ``torchreid.data``, ``engine``, ``optim``, ``losses`` and
+``metrics`` stay unimported, and architecture modules are imported on the
+first ``build_model`` call for them.
+
+Examples::
+    >>> from torchreid.inference import FeatureExtractor
+    >>> extractor = FeatureExtractor('osnet_x0_25', 'osnet_x0_25_msmt17.pt')
+"""
+from __future__ import absolute_import
+
+from torchreid.models import build_model, show_avai_models
+from torchreid.utils.torchtools import (
+    load_pretrained_weights, fuse_conv_bn, cache_flat_weights
+)
+from torchreid.utils.feature_extractor import FeatureExtractor, optimize_model
+
+__all__ = [
+    'FeatureExtractor', 'optimize_model', 'build_model', 'show_avai_models',
+    'load_pretrained_weights', 'fuse_conv_bn', 'cache_flat_weights'
+]
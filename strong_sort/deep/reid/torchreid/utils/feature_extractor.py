@@ -1,15 +1,105 @@
 from __future__ import absolute_import
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 import numpy as np
 import torch
+import torch.nn.functional as F
 import torchvision.transforms as T
 from PIL import Image
+from torchvision.ops import roi_align
 
 from torchreid.utils import (
-    check_isfile, load_pretrained_weights, compute_model_complexity
+    check_isfile, load_pretrained_weights, compute_model_complexity,
+    mkdir_if_missing, fuse_conv_bn, get_cache_dir, sha256_file
 )
 from torchreid.models import build_model
 
 
+def _size(size):
+    """(height, width) tuple of a size given as a sequence or an int."""
+    if isinstance(size, int):
+        return (size, size)
+    return tuple(size)
+
+
+class _OnnxModel(object):
+    """Wraps an ONNX Runtime session so it can be called like a torch model."""
+
+    def __init__(self, model_path, device, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        providers = ['CPUExecutionProvider']
+        if device.type == 'cuda':
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=providers
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, images):
+        features = self.session.run(
+            None, {self.input_name: images.cpu().numpy()}
+        )[0]
+        return torch.from_numpy(features)
+
+
+def optimize_model(
+    model, image_size, device, mode=True, model_name='', model_path='',
+    cache_dir=None
+):
+    """Prepares an eval-mode model for inference.
+
+    BatchNorm is folded into the preceding convolutions and the model is
+    switched to channels-last. With ``mode='freeze'`` the model is then
+    traced and frozen with ``torch.jit.freeze``; the frozen module is cached
+    in ``cache_dir`` keyed by the sha256 of ``model_path``, so later
+    processes load it instead of rebuilding it. With ``mode='compile'`` the
+    model is wrapped with ``torch.compile`` (compiled kernels are cached by
+    PyTorch itself).
+    """
+    cache_file = None
+    if mode == 'freeze' and model_path and check_isfile(model_path):
+        cache_dir = cache_dir or get_cache_dir('optimized')
+        key = '{}_{}x{}_{}_{}'.format(
+            model_name, image_size[0], image_size[1], device.type,
+            torch.__version__
+        )
+        key = hashlib.sha256(
+            (sha256_file(model_path) + key).encode()
+        ).hexdigest()[:16]
+        cache_file = os.path.join(
+            cache_dir, '{}_{}.torchscript'.format(model_name or 'model', key)
+        )
+        if os.path.isfile(cache_file):
+            return torch.jit.load(cache_file, map_location=device)
+
+    fuse_conv_bn(model)
+    model = model.to(device, memory_format=torch.channels_last)
+
+    if mode == 'freeze':
+        example = torch.zeros(1, 3, *image_size, device=device)
+        example = example.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            model = torch.jit.freeze(torch.jit.trace(model, example).eval())
+        if cache_file is not None:
+            mkdir_if_missing(os.path.dirname(cache_file))
+            model.save(cache_file)
+    elif mode == 'compile':
+        model = torch.compile(model)
+    elif mode is not True:
+        raise ValueError(
+            'Unknown optimize mode: {}. Must be one of '
+            '[True, "freeze", "compile"]'.format(mode)
+        )
+    return model
+
+
 class FeatureExtractor(object):
     """A simple API for feature extraction.
 
@@ -24,15 +114,67 @@ class FeatureExtractor(object):
     Returned is a torch tensor with shape (B, D) where D is the
     feature dimension.
 
+    To extract features of many boxes in one frame, use
+    ``extract_boxes(image, boxes)``, which crops and resizes all boxes in a
+    single batched ROI-align op on GPU (on CPU, where that is slower, the
+    boxes are sliced out of the image and go through ``preprocess``).
+
+    With ``input_sizes``, boxes are bucketed by their height: each box is
+    resized to the smallest input size at least as tall as the box (the
+    largest one if none is), so a 40-pixel pedestrian goes through e.g.
+    128x64 instead of 256x128 at a quarter of the FLOPs. Each bucket is a
+    separate batch. A model does not embed the same box at two input sizes
+    to the same point, so features are calibrated per bucket: they are
+    centered on the running mean of all features their bucket has produced
+    and then L2-normalized, which removes the offset between the buckets
+    and keeps cosine distances across buckets comparable. Until a bucket
+    has produced ``calibration_samples`` features its features are only
+    L2-normalized. This relies on the global pooling of the model (e.g.
+    OSNet) and is not available with the 'onnx' backend, whose input size
+    is fixed at export.
+
     Args:
         model_name (str): model name.
         model_path (str): path to model weights.
-        image_size (sequence or int): image height and width.
+        image_size (sequence or int): image height and width; an int is a
+            square size.
         pixel_mean (list): pixel mean for normalization.
         pixel_std (list): pixel std for normalization.
         pixel_norm (bool): whether to normalize pixels.
         device (str): 'cpu' or 'cuda' (could be specific gpu devices).
         verbose (bool): show model details.
+        backend (str): 'pytorch' builds ``model_name`` and loads the weights
+            from ``model_path``; 'torchscript' and 'onnx' load a model
+            exported with ``strong_sort/deep/reid_export.py`` from
+            ``model_path`` and run it with TorchScript or ONNX Runtime.
+            'int8' loads a TorchScript model quantized with
+            ``strong_sort/deep/reid_quantize.py``; it always runs on CPU.
+        num_threads (int, optional): number of intra-op threads of the ONNX
+            Runtime session of the 'onnx' backend. The other backends run on
+            PyTorch's thread pool, which is process-wide and shared with
+            e.g. the detector, so its size is left to the caller
+            (``torch.set_num_threads``).
+        optimize (bool or str): 'pytorch' backend only. True folds BatchNorm
+            into the convolutions and runs the model channels-last; 'freeze'
+            also traces and freezes it (cached on disk by weights hash) and
+            'compile' also applies ``torch.compile``. See ``optimize_model``.
+        cache_dir (str, optional): where frozen models are cached. Default is
+            ``$TORCH_HOME/torchreid/optimized``.
+        input_sizes (list, optional): (height, width) input sizes boxes are
+            bucketed into by ``extract_boxes``, e.g. [(128, 64), (256, 128)];
+            ints are square sizes.
+        calibration_samples (int): number of features a bucket of
+            ``input_sizes`` has to produce before its running mean is used
+            to calibrate its features.
+        preprocessing (str): how lists of images/paths are preprocessed.
+            'pil' goes through ``to_pil`` and torchvision transforms one
+            image at a time; 'cv2' resizes with ``cv2.resize`` on a thread
+            pool (OpenCV releases the GIL) into a float buffer reused across
+            calls that is normalized in one vectorized op. Image paths are
+            read as RGB and grayscale images are expanded to RGB in both
+            cases.
+        preprocess_workers (int): threads used by 'cv2' preprocessing; call
+            ``close`` to shut them down.
 
     Examples::
 
@@ -65,27 +207,56 @@ class FeatureExtractor(object):
         pixel_std=[0.229, 0.224, 0.225],
         pixel_norm=True,
         device='cuda',
-        verbose=True
+        verbose=True,
+        backend='pytorch',
+        num_threads=None,
+        optimize=False,
+        cache_dir=None,
+        input_sizes=None,
+        calibration_samples=100,
+        preprocessing='pil',
+        preprocess_workers=4
     ):
-        # Build model
-        model = build_model(
-            model_name,
-            num_classes=1,
-            pretrained=not (model_path and check_isfile(model_path)),
-            use_gpu=device.startswith('cuda')
-        )
-        model.eval()
-
-        if verbose:
-            num_params, flops = compute_model_complexity(
-                model, (1, 3, image_size[0], image_size[1])
+        image_size = _size(image_size)
+        if backend == 'pytorch':
+            # Build model
+            model = build_model(
+                model_name,
+                num_classes=1,
+                pretrained=not (model_path and check_isfile(model_path)),
+                use_gpu=device.startswith('cuda')
             )
-            print('Model: {}'.format(model_name))
-            print('- params: {:,}'.format(num_params))
-            print('- flops: {:,}'.format(flops))
+            model.eval()
+
+            if verbose:
+                num_params, flops = compute_model_complexity(
+                    model, (1, 3, image_size[0], image_size[1])
+                )
+                print('Model: {}'.format(model_name))
+                print('- params: {:,}'.format(num_params))
+                print('- flops: {:,}'.format(flops))
+
+            if model_path and check_isfile(model_path):
+                load_pretrained_weights(model, model_path)
 
-        if model_path and check_isfile(model_path):
-            load_pretrained_weights(model, model_path)
+        elif backend == 'torchscript':
+            model = torch.jit.load(str(model_path), map_location=device)
+            model.eval()
+
+        elif backend == 'onnx':
+            model = _OnnxModel(model_path, torch.device(device), num_threads)
+
+        elif backend == 'int8':
+            # quantized kernels are CPU only
+            device = 'cpu'
+            model = torch.jit.load(str(model_path), map_location=device)
+            model.eval()
+
+        else:
+            raise ValueError(
+                'Unknown backend: {}. Must be one of '
+                '["pytorch", "torchscript", "onnx", "int8"]'.format(backend)
+            )
 
         # Build transform functions
         transforms = []
@@ -97,17 +268,104 @@ class FeatureExtractor(object):
 
         to_pil = T.ToPILImage()
 
+        if preprocessing not in ('pil', 'cv2'):
+            raise ValueError(
+                'Unknown preprocessing: {}. Must be one of '
+                '["pil", "cv2"]'.format(preprocessing)
+            )
+        pool = None
+        if preprocessing == 'cv2':
+            pool = ThreadPoolExecutor(max_workers=preprocess_workers)
+
         device = torch.device(device)
-        model.to(device)
+        if backend != 'onnx':
+            model.to(device)
+        optimize = optimize if backend == 'pytorch' else False
+        if optimize:
+            model = optimize_model(
+                model, image_size, device, optimize, model_name, model_path,
+                cache_dir
+            )
 
         # Class attributes
         self.model = model
         self.preprocess = preprocess
         self.to_pil = to_pil
         self.device = device
+        self.backend = backend
+        self.image_size = image_size
+        if input_sizes is not None:
+            if backend == 'onnx':
+                raise ValueError(
+                    'input_sizes is not supported by the onnx backend'
+                )
+            input_sizes = sorted(_size(size) for size in input_sizes)
+        self.input_sizes = input_sizes
+        self.calibration_samples = calibration_samples
+        self._bucket_stats = {}  # bucket: (count, running mean of features)
+        self.pixel_mean = torch.tensor(pixel_mean, device=device).view(1, -1, 1, 1)
+        self.pixel_std = torch.tensor(pixel_std, device=device).view(1, -1, 1, 1)
+        self.pixel_norm = pixel_norm
+        self.optimize = optimize
+        self.preprocessing = preprocessing
+        self._pool = pool
+        self._buffers = threading.local()
+        self._mean = np.asarray(pixel_mean, dtype=np.float32).reshape(1, -1, 1, 1)
+        self._std = np.asarray(pixel_std, dtype=np.float32).reshape(1, -1, 1, 1)
+
+    def _preprocess_cv2(self, input):
+        """Resizes and normalizes a list of images/paths into a (B, C, H, W)
+        tensor.
+
+        The images are written into a float buffer of the calling thread that
+        is reused across calls and only grows when a batch does not fit. The
+        returned tensor shares its memory, so it is valid until the next call
+        from the same thread; ``__call__`` runs the model on it right away.
+        """
+        height, width = self.image_size
+        buffer = getattr(self._buffers, 'buffer', None)
+        if buffer is None or len(buffer) < len(input):
+            buffer = np.empty((len(input), 3, height, width), dtype=np.float32)
+            self._buffers.buffer = buffer
+        buffer = buffer[:len(input)]
+
+        def _resize(i):
+            element = input[i]
+            if isinstance(element, str):
+                image = cv2.cvtColor(cv2.imread(element), cv2.COLOR_BGR2RGB)
+            elif isinstance(element, np.ndarray):
+                image = element
+            else:
+                raise TypeError(
+                    'Type of each element must belong to [str | numpy.ndarray]'
+                )
+            if image.ndim == 2 or image.shape[2] == 1:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+            # area averaging when shrinking, like PIL's antialiased resize
+            shrink = image.shape[0] > height or image.shape[1] > width
+            image = cv2.resize(
+                image, (width, height),
+                interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR
+            )
+            buffer[i] = image.transpose(2, 0, 1)
+
+        list(self._pool.map(_resize, range(len(input))))
+        buffer *= 1. / 255.
+        if self.pixel_norm:
+            buffer -= self._mean
+            buffer /= self._std
+        return torch.from_numpy(buffer)
+
+    def close(self):
+        """Shuts down the thread pool of 'cv2' preprocessing."""
+        if self._pool is not None:
+            self._pool.shutdown()
 
     def __call__(self, input):
-        if isinstance(input, list):
+        if isinstance(input, list) and self._pool is not None:
+            images = self._preprocess_cv2(input).to(self.device)
+
+        elif isinstance(input, list):
             images = []
 
             for element in input:
@@ -115,7 +373,7 @@ class FeatureExtractor(object):
                     image = Image.open(element).convert('RGB')
 
                 elif isinstance(element, np.ndarray):
-                    image = self.to_pil(element)
+                    image = self.to_pil(element).convert('RGB')
 
                 else:
                     raise TypeError(
@@ -146,7 +404,153 @@ class FeatureExtractor(object):
         else:
             raise NotImplementedError
 
+        if self.optimize:
+            images = images.contiguous(memory_format=torch.channels_last)
+
         with torch.no_grad():
             features = self.model(images)
 
         return features
+
+    def _image_tensor(self, image):
+        if isinstance(image, np.ndarray):
+            image = torch.from_numpy(np.ascontiguousarray(image))
+        image = image.to(self.device).permute(2, 0, 1).unsqueeze(0).float()
+        image /= 255.
+        return image
+
+    def _image_region(self, image, boxes):
+        # Only the part of the image covered by the boxes is converted to
+        # float. The margin keeps every pixel bilinear sampling reads inside
+        # the region, and the region ends at the image border only where the
+        # image does, so the crops are the same as from the whole image.
+        boxes = torch.as_tensor(boxes, dtype=torch.float32)
+        height, width = image.shape[:2]
+        if len(boxes):
+            x1 = min(max(int(boxes[:, 0].min().floor()) - 2, 0), width - 1)
+            y1 = min(max(int(boxes[:, 1].min().floor()) - 2, 0), height - 1)
+            x2 = max(min(int(boxes[:, 2].max().ceil()) + 2, width), x1 + 1)
+            y2 = max(min(int(boxes[:, 3].max().ceil()) + 2, height), y1 + 1)
+        else:
+            x1, y1, x2, y2 = 0, 0, 1, 1
+        boxes = boxes - boxes.new_tensor([x1, y1, x1, y1])
+        return self._image_tensor(image[y1:y2, x1:x2]), boxes.to(self.device)
+
+    def _crop(self, image, boxes, size):
+        rois = torch.cat([boxes.new_zeros((boxes.size(0), 1)), boxes], dim=1)
+        images = roi_align(
+            image, rois, output_size=size, spatial_scale=1.,
+            sampling_ratio=0, aligned=True
+        )
+        if self.pixel_norm:
+            images = (images - self.pixel_mean) / self.pixel_std
+        return images
+
+    def preprocess_boxes(self, image, boxes, size=None):
+        """Crops and resizes boxes of one image in a single batched op.
+
+        The region of the image covered by the boxes is converted to a float
+        tensor once, all boxes are resampled to
+        ``size`` (default ``image_size``) with ROI align (adaptive sampling,
+        so large boxes are averaged rather than aliased) and normalization
+        is applied to the whole batch.
+
+        Args:
+            image (numpy.ndarray or torch.Tensor): image with shape (H, W, C),
+                uint8 in [0, 255].
+            boxes (numpy.ndarray or torch.Tensor): boxes with shape (B, 4) in
+                (x1, y1, x2, y2) pixel coordinates, with x2/y2 exclusive.
+            size (tuple, optional): output (height, width).
+
+        Returns:
+            torch.Tensor: batch with shape (B, C, H, W).
+        """
+        image, boxes = self._image_region(image, boxes)
+        return self._crop(image, boxes, size or self.image_size)
+
+    def _bucketize(self, boxes):
+        if self.input_sizes is None:
+            return boxes.new_zeros(boxes.size(0), dtype=torch.long)
+        heights = boxes.new_tensor([h for h, _ in self.input_sizes])
+        buckets = torch.bucketize(boxes[:, 3] - boxes[:, 1], heights)
+        return buckets.clamp_(max=len(self.input_sizes) - 1)
+
+    def extract_batches(self, requests):
+        """Extracts features of the boxes of several images.
+
+        Boxes of all images that are resized to the same input size go
+        through the model in one batch.
+
+        Args:
+            requests (list): (image, boxes) pairs as taken by
+                ``extract_boxes``.
+
+        Returns:
+            list: one torch.Tensor of shape (B, D) per request.
+        """
+        sizes = self.input_sizes or [self.image_size]
+        crops = [[] for _ in sizes]  # per size: (request, box indices, images)
+        for r, (image, boxes) in enumerate(requests):
+            image, boxes = self._image_region(image, boxes)
+            buckets = self._bucketize(boxes)
+            for b in buckets.unique().tolist():
+                index = (buckets == b).nonzero().squeeze(1)
+                crops[b].append((r, index, self._crop(image, boxes[index], sizes[b])))
+
+        features = [None] * len(requests)
+        for b, size_crops in enumerate(crops):
+            if not size_crops:
+                continue
+            batch_features = self(torch.cat([images for _, _, images in size_crops]))
+            if self.input_sizes is not None:
+                batch_features = self._calibrate(b, batch_features)
+            batch_features = batch_features.split(
+                [len(index) for _, index, _ in size_crops]
+            )
+            for (r, index, _), f in zip(size_crops, batch_features):
+                if features[r] is None:
+                    features[r] = f.new_empty((len(requests[r][1]), f.size(1)))
+                features[r][index.to(f.device)] = f
+        return features
+
+    def _calibrate(self, bucket, features):
+        features = features.float()
+        count, mean = self._bucket_stats.get(bucket, (0, features.new_zeros(features.size(1))))
+        count += features.size(0)
+        mean = mean + (features - mean).sum(dim=0) / count
+        self._bucket_stats[bucket] = (count, mean)
+        if count >= self.calibration_samples:
+            features = features - mean
+        return F.normalize(features, dim=1)
+
+    def extract_boxes(self, image, boxes):
+        """Extracts features of all boxes of one image.
+
+        Without ``input_sizes``, boxes are cropped with ROI align on GPU and
+        sliced out of the image and preprocessed one at a time on CPU, where
+        ROI align is the slower of the two.
+
+        Args:
+            image (numpy.ndarray or torch.Tensor): image with shape (H, W, C).
+            boxes (numpy.ndarray or torch.Tensor): boxes with shape (B, 4) in
+                (x1, y1, x2, y2) pixel coordinates.
+
+        Returns:
+            torch.Tensor: features with shape (B, D).
+        """
+        if self.input_sizes is None:
+            if torch.device(self.device).type == 'cpu':
+                return self(self._box_crops(image, boxes))
+            return self(self.preprocess_boxes(image, boxes))
+        return self.extract_batches([(image, boxes)])[0]
+
+    def _box_crops(self, image, boxes):
+        if isinstance(image, torch.Tensor):
+            image = image.cpu().numpy()
+        height, width = image.shape[:2]
+        crops = []
+        for x1, y1, x2, y2 in np.asarray(boxes).tolist():
+            x1, y1 = max(int(np.floor(x1)), 0), max(int(np.floor(y1)), 0)
+            x2, y2 = min(int(np.ceil(x2)), width), min(int(np.ceil(y2)), height)
+            crops.append(image[y1:y2, x1:x2])
+        return crops
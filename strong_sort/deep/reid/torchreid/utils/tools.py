@@ -4,6 +4,7 @@ import sys
 import json
 import time
 import errno
+import hashlib
 import numpy as np
 import random
 import os.path as osp
@@ -15,7 +16,7 @@ from PIL import Image
 __all__ = [
     'mkdir_if_missing', 'check_isfile', 'read_json', 'write_json',
     'set_random_seed', 'download_url', 'read_image', 'collect_env_info',
-    'listdir_nohidden'
+    'listdir_nohidden', 'get_cache_dir', 'sha256_file'
 ]
 
 
@@ -44,6 +45,26 @@ def check_isfile(fpath):
     return isfile
 
 
+def get_cache_dir(name):
+    """Returns the torchreid cache directory ``$TORCH_HOME/torchreid/<name>``."""
+    torch_home = osp.expanduser(
+        os.getenv(
+            'TORCH_HOME',
+            osp.join(os.getenv('XDG_CACHE_HOME', '~/.cache'), 'torch')
+        )
+    )
+    return osp.join(torch_home, 'torchreid', name)
+
+
+def sha256_file(fpath, chunk_size=1 << 20):
+    """Returns the hex sha256 digest of a file."""
+    sha = hashlib.sha256()
+    with open(fpath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
 def read_json(fpath):
     """Reads json file from a path."""
     with open(fpath, 'r') as f:
@@ -1,21 +1,31 @@
 from __future__ import division, print_function, absolute_import
+import os
+import json
+import struct
 import pickle
 import shutil
 import os.path as osp
 import warnings
 from functools import partial
 from collections import OrderedDict
+import numpy as np
 import torch
 import torch.nn as nn
 
-from .tools import mkdir_if_missing
+from .tools import (
+    mkdir_if_missing, get_cache_dir, sha256_file, read_json, write_json
+)
 
 __all__ = [
     'save_checkpoint', 'load_checkpoint', 'resume_from_checkpoint',
     'open_all_layers', 'open_specified_layers', 'count_num_param',
-    'load_pretrained_weights'
+    'load_pretrained_weights', 'fuse_conv_bn', 'save_flat_weights',
+    'load_flat_weights', 'cache_flat_weights', 'FLAT_WEIGHTS_SUFFIX'
 ]
 
+FLAT_WEIGHTS_SUFFIX = '.rtw'
+_FLAT_ALIGN = 64
+
 
 def save_checkpoint(
     state, save_dir, is_best=False, remove_module_from_keys=False
@@ -95,6 +105,130 @@ def load_checkpoint(fpath):
     return checkpoint
 
 
+def save_flat_weights(state_dict, fpath):
+    r"""Saves a state dict in a flat, memory-mappable format.
+
+    Layout: an 8-byte little-endian header length, a JSON header mapping
+    each name to its dtype, shape and data offset, then the raw tensor data
+    (64-byte aligned). bfloat16 tensors are stored as float32.
+
+    Args:
+        state_dict (dict): name -> tensor.
+        fpath (str): path to save to.
+    """
+    header, arrays, offset = {}, [], 0
+    for name, tensor in state_dict.items():
+        tensor = tensor.detach().cpu()
+        if tensor.dtype == torch.bfloat16:
+            tensor = tensor.float()
+        array = np.ascontiguousarray(tensor.numpy())
+        offset = -(-offset // _FLAT_ALIGN) * _FLAT_ALIGN
+        header[name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset
+        }
+        arrays.append((offset, array))
+        offset += array.nbytes
+    header = json.dumps(header).encode()
+    # pad the header with spaces so the data starts aligned
+    start = -(-(8 + len(header)) // _FLAT_ALIGN) * _FLAT_ALIGN
+    header = header.ljust(start - 8)
+
+    mkdir_if_missing(osp.dirname(osp.abspath(fpath)))
+    with open(fpath, 'wb') as f:
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for offset, array in arrays:
+            f.seek(start + offset)
+            f.write(array.tobytes())
+
+
+def load_flat_weights(fpath):
+    r"""Memory-maps a file written by ``save_flat_weights``.
+
+    No data is read or copied: the returned tensors are copy-on-write views
+    of the mapped file, so processes loading the same file share its pages.
+
+    Args:
+        fpath (str): path to the file.
+
+    Returns:
+        OrderedDict: name -> tensor.
+    """
+    with open(fpath, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size).decode())
+    state_dict = OrderedDict()
+    if not header:
+        return state_dict
+    data = np.memmap(fpath, dtype=np.uint8, mode='c', offset=8 + header_size)
+    for name, info in header.items():
+        array = np.ndarray(
+            info['shape'], dtype=np.dtype(info['dtype']), buffer=data,
+            offset=info['offset']
+        )
+        state_dict[name] = torch.from_numpy(array)
+    return state_dict
+
+
+def cache_flat_weights(weight_path, cache_dir=None):
+    r"""Returns a flat, memory-mappable copy of a checkpoint.
+
+    The copy lives in a content-addressed cache (named by the sha256 of the
+    checkpoint) and is only written the first time a checkpoint is seen.
+    Checkpoints are hashed once: the digest is remembered in an index keyed
+    by path, size and modification time. Files are written atomically, so
+    several processes can start at once.
+
+    Args:
+        weight_path (str): path to a checkpoint readable by
+            ``load_checkpoint``.
+        cache_dir (str, optional): cache directory. Default is
+            ``$TORCH_HOME/torchreid/weights``.
+
+    Returns:
+        str: path to the flat weights, to be passed to
+        ``load_pretrained_weights``.
+
+    Examples::
+        >>> from torchreid.utils import cache_flat_weights, load_pretrained_weights
+        >>> load_pretrained_weights(model, cache_flat_weights('osnet_x0_25_msmt17.pt'))
+    """
+    cache_dir = cache_dir or get_cache_dir('weights')
+    mkdir_if_missing(cache_dir)
+    weight_path = osp.abspath(osp.expanduser(str(weight_path)))
+    stat = os.stat(weight_path)
+
+    index_path = osp.join(cache_dir, 'index.json')
+    index = read_json(index_path) if osp.isfile(index_path) else {}
+    entry = index.get(weight_path)
+    if entry is None or entry['size'] != stat.st_size \
+            or entry['mtime'] != stat.st_mtime:
+        entry = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': sha256_file(weight_path)
+        }
+        index[weight_path] = entry
+        tmp_path = '{}.{}.tmp'.format(index_path, os.getpid())
+        write_json(index, tmp_path)
+        os.replace(tmp_path, index_path)
+
+    fpath = osp.join(cache_dir, entry['sha256'] + FLAT_WEIGHTS_SUFFIX)
+    if not osp.isfile(fpath):
+        checkpoint = load_checkpoint(weight_path)
+        state_dict = checkpoint.get('state_dict', checkpoint)
+        state_dict = OrderedDict(
+            (k[7:] if k.startswith('module.') else k, v)
+            for k, v in state_dict.items()
+        )
+        tmp_path = '{}.{}.tmp'.format(fpath, os.getpid())
+        save_flat_weights(state_dict, tmp_path)
+        os.replace(tmp_path, fpath)
+    return fpath
+
+
 def resume_from_checkpoint(fpath, model, optimizer=None, scheduler=None):
     r"""Resumes training from a checkpoint.
 
@@ -260,6 +394,8 @@ def load_pretrained_weights(model, weight_path):
     Features::
         - Incompatible layers (unmatched in name or size) will be ignored.
         - Can automatically deal with keys containing "module.".
+        - Flat weights (``FLAT_WEIGHTS_SUFFIX``) are memory-mapped and
+          assigned to the model without copying.
 
     Args:
         model (nn.Module): network model.
@@ -270,7 +406,11 @@ def load_pretrained_weights(model, weight_path):
         >>> weight_path = 'log/my_model/model-best.pth.tar'
         >>> load_pretrained_weights(model, weight_path)
     """
-    checkpoint = load_checkpoint(weight_path)
+    flat = str(weight_path).endswith(FLAT_WEIGHTS_SUFFIX)
+    if flat:
+        checkpoint = load_flat_weights(weight_path)
+    else:
+        checkpoint = load_checkpoint(weight_path)
     if 'state_dict' in checkpoint:
         state_dict = checkpoint['state_dict']
     else:
@@ -291,7 +431,14 @@ def load_pretrained_weights(model, weight_path):
             discarded_layers.append(k)
 
     model_dict.update(new_state_dict)
-    model.load_state_dict(model_dict)
+    if flat:
+        try:
+            # keep the memory-mapped tensors instead of copying them
+            model.load_state_dict(model_dict, assign=True)
+        except TypeError:  # torch < 2.1
+            model.load_state_dict(model_dict)
+    else:
+        model.load_state_dict(model_dict)
 
     if len(matched_layers) == 0:
         warnings.warn(
@@ -310,3 +457,42 @@ def load_pretrained_weights(model, weight_path):
                 'due to unmatched keys or layer size: {}'.
                 format(discarded_layers)
             )
+
+
+
+def fuse_conv_bn(model):
+    r"""Folds BatchNorm layers into the preceding convolutions for inference.
+
+    Works on blocks that apply ``self.bn`` right after ``self.conv`` (or
+    ``self.conv2``), like the conv layers of OSNet, OSNet-AIN and MobileNetV2.
+    The convolution is replaced with a biased one computing ``bn(conv(x))``
+    with the running statistics, and the BatchNorm with ``nn.Identity``.
+    InstanceNorm layers are kept as their statistics depend on the input.
+
+    Args:
+        model (nn.Module): network model in eval mode.
+
+    Returns:
+        int: number of folded BatchNorm layers.
+
+    Examples::
+        >>> from torchreid.utils import fuse_conv_bn
+        >>> model.eval()
+        >>> fuse_conv_bn(model)
+    """
+    from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+    assert not model.training, 'BatchNorm can only be folded in eval mode'
+    num_fused = 0
+    for m in model.modules():
+        bn = getattr(m, 'bn', None)
+        if not isinstance(bn, nn.BatchNorm2d):
+            continue
+        for name in ('conv2', 'conv'):
+            conv = getattr(m, name, None)
+            if isinstance(conv, nn.Conv2d) and conv.out_channels == bn.num_features:
+                setattr(m, name, fuse_conv_bn_eval(conv, bn))
+                m.bn = nn.Identity()
+                num_fused += 1
+                break
+    return num_fused
@@ -0,0 +1,228 @@
+"""
+Benchmark the throughput of the ReID backbones on CPU.
+
+Usage:
+$ python strong_sort/deep/reid_benchmark.py --models osnet_x0_25 mobilenetv2_x1_0 --batch-sizes 1 8 32 \
+    --threads 1 4 --dtypes fp32 int8 --backends eager torchscript onnx
+
+Every combination of model (default: all models in reid_model_factory),
+batch size, thread count, dtype (fp32 / bf16 / int8) and backend
+(eager / torchscript / onnx) is timed on random input. Crops/sec and
+per-batch latency percentiles are written, together with params/FLOPs from
+`compute_model_complexity`, to `<out>.csv` and `<out>.json`. Combinations a
+runtime does not support (bf16 and int8 with ONNX, int8 for models other
+than osnet / mobilenetv2) are skipped. Every row has a `status`: 'ok', or
+'failed' with the exception in `error` when a model, backend or batch
+could not be built or run; the script then exits with status 1 once the
+results are written.
+
+With `--baseline`, crops/sec are compared against a previous JSON result
+and the script exits with status 1 if any of them dropped by more than
+`--tolerance`. `--save-baseline` writes the current results as baseline.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[2]  # yolov5 strongsort root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+if str(FILE.parents[0] / 'reid') not in sys.path:
+    sys.path.append(str(FILE.parents[0] / 'reid'))  # add torchreid to PATH
+
+from strong_sort.deep.reid_model_factory import get_model_types
+from strong_sort.deep.reid_export import export_onnx
+from torchreid.inference import FeatureExtractor, build_model
+from torchreid.utils import compute_model_complexity
+
+KEY = ('model', 'backend', 'dtype', 'threads', 'batch_size')
+
+
+def build_runner(name, model, backend, dtype, threads, image_size, workdir):
+    """Returns a callable running one batch, or None if the combination is
+    not supported."""
+    if dtype == 'int8':
+        from strong_sort.deep.reid_quantize import QUANTIZABLE_MODELS, quantize_static
+
+        if backend == 'onnx' or not name.startswith(QUANTIZABLE_MODELS):
+            return None
+        model = quantize_static(model, torch.rand(32, 3, *image_size))
+    elif dtype == 'bf16' and backend == 'onnx':
+        return None
+
+    torch.set_num_threads(threads)
+    example = torch.rand(1, 3, *image_size)
+    if backend == 'torchscript':
+        with torch.no_grad(), autocast(dtype):
+            model = torch.jit.freeze(torch.jit.trace(model, example).eval())
+    elif backend == 'onnx':
+        file = export_onnx(model, Path(workdir) / (name + '.onnx'), image_size)
+        model = FeatureExtractor(
+            model_path=file, image_size=image_size, device='cpu', verbose=False,
+            backend='onnx', num_threads=threads
+        ).model
+
+    def run(images):
+        with torch.no_grad(), autocast(dtype):
+            return model(images)
+    return run
+
+
+def autocast(dtype):
+    if dtype == 'bf16':
+        return torch.autocast('cpu', dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def time_batches(run, batch_size, image_size, warmup=3, iters=20):
+    """Returns per-batch latencies in ms."""
+    images = torch.rand(batch_size, 3, *image_size)
+    for _ in range(warmup):
+        run(images)
+    latencies = []
+    for _ in range(iters):
+        t = time.perf_counter()
+        run(images)
+        latencies.append(1000 * (time.perf_counter() - t))
+    return np.array(latencies)
+
+
+def check_regressions(results, baseline, tolerance):
+    """Returns the results whose crops/sec dropped by more than `tolerance`
+    (relative) against the matching baseline entry."""
+    baseline = {tuple(r[k] for k in KEY): r for r in baseline if r.get('status', 'ok') == 'ok'}
+    regressions = []
+    for r in results:
+        ref = baseline.get(tuple(r[k] for k in KEY))
+        if r['status'] == 'ok' and ref is not None and \
+                r['crops_per_sec'] < (1 - tolerance) * ref['crops_per_sec']:
+            regressions.append((r, ref))
+    return regressions
+
+
+def failure(error, model, backend=None, dtype=None, threads=None, batch_size=None,
+            params=None, flops=None):
+    """Result row of a configuration that could not be built or run."""
+    print('FAILED {} {} {} threads={} bs={}: {}'.format(
+        model, backend, dtype, threads, batch_size, error))
+    return {
+        'model': model, 'backend': backend, 'dtype': dtype, 'threads': threads,
+        'batch_size': batch_size, 'params': params, 'flops': flops,
+        'status': 'failed', 'error': '{}: {}'.format(type(error).__name__, error),
+        'crops_per_sec': None, 'p50_ms': None, 'p90_ms': None, 'p99_ms': None,
+    }
+
+
+def run(models=None, batch_sizes=(1, 8, 32, 128), threads=(1,), dtypes=('fp32',),
+        backends=('eager',), image_size=(256, 128), warmup=3, iters=20,
+        out='runs/reid_benchmark/results', baseline=None, tolerance=0.1,
+        save_baseline=False):
+    models = models or get_model_types()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in models:
+            try:
+                model = build_model(name, num_classes=1, pretrained=False, use_gpu=False).eval()
+                num_params, flops = compute_model_complexity(model, (1, 3, *image_size))
+            except Exception as e:  # e.g. hacnn only takes 160x64 inputs
+                results.append(failure(e, name))
+                continue
+            for backend in backends:
+                for dtype in dtypes:
+                    for t in threads:
+                        try:
+                            runner = build_runner(name, model, backend, dtype, t, image_size, workdir)
+                        except Exception as e:
+                            results.append(failure(e, name, backend, dtype, t, None, num_params, flops))
+                            continue
+                        if runner is None:
+                            print('{} {} {}: not supported, skipped'.format(name, backend, dtype))
+                            continue
+                        for batch_size in batch_sizes:
+                            try:
+                                latencies = time_batches(runner, batch_size, image_size, warmup, iters)
+                            except Exception as e:
+                                results.append(failure(e, name, backend, dtype, t, batch_size, num_params, flops))
+                                break
+                            result = {
+                                'model': name, 'backend': backend, 'dtype': dtype,
+                                'threads': t, 'batch_size': batch_size,
+                                'params': num_params, 'flops': flops,
+                                'status': 'ok', 'error': '',
+                                'crops_per_sec': 1000 * batch_size / latencies.mean(),
+                                'p50_ms': float(np.percentile(latencies, 50)),
+                                'p90_ms': float(np.percentile(latencies, 90)),
+                                'p99_ms': float(np.percentile(latencies, 99)),
+                            }
+                            results.append(result)
+                            print('{model} {backend} {dtype} threads={threads} bs={batch_size}: '
+                                  '{crops_per_sec:.1f} crops/s, p50 {p50_ms:.2f} ms, '
+                                  'p99 {p99_ms:.2f} ms'.format(**result))
+
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out.with_suffix('.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()) if results else KEY)
+        writer.writeheader()
+        writer.writerows(results)
+    with open(out.with_suffix('.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Results saved to {} and {}'.format(out.with_suffix('.csv'), out.with_suffix('.json')))
+
+    if baseline is not None:
+        baseline = Path(baseline)
+        if save_baseline:
+            with open(baseline, 'w') as f:
+                json.dump(results, f, indent=2)
+            print('Baseline saved to {}'.format(baseline))
+        else:
+            with open(baseline) as f:
+                regressions = check_regressions(results, json.load(f), tolerance)
+            for r, ref in regressions:
+                print('REGRESSION {model} {backend} {dtype} threads={threads} bs={batch_size}: '.format(**r) +
+                      '{:.1f} crops/s vs {:.1f} baseline'.format(r['crops_per_sec'], ref['crops_per_sec']))
+            if regressions:
+                sys.exit(1)
+    failed = [r for r in results if r['status'] == 'failed']
+    if failed:
+        print('{} configuration(s) failed, see the error column'.format(len(failed)))
+        sys.exit(1)
+    return results
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', nargs='+', default=None, help='model types, default: all')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32, 128])
+    parser.add_argument('--threads', nargs='+', type=int, default=[1])
+    parser.add_argument('--dtypes', nargs='+', default=['fp32'], help='fp32, bf16, int8')
+    parser.add_argument('--backends', nargs='+', default=['eager'], help='eager, torchscript, onnx')
+    parser.add_argument('--imgsz', nargs=2, type=int, default=[256, 128], help='input height, width')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed batches per configuration')
+    parser.add_argument('--iters', type=int, default=20, help='timed batches per configuration')
+    parser.add_argument('--out', type=str, default='runs/reid_benchmark/results', help='output path without suffix')
+    parser.add_argument('--baseline', type=str, default=None, help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='max relative crops/sec drop vs baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to --baseline')
+    opt = parser.parse_args()
+    return opt
+
+
+def main(opt):
+    run(opt.models, opt.batch_sizes, opt.threads, opt.dtypes, opt.backends,
+        tuple(opt.imgsz), opt.warmup, opt.iters, opt.out, opt.baseline,
+        opt.tolerance, opt.save_baseline)
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
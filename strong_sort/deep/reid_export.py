@@ -0,0 +1,120 @@
+"""
+Export a ReID model to ONNX (dynamic batch) or TorchScript.
+
+Usage:
+$ python strong_sort/deep/reid_export.py --weights weights/osnet_x0_25_msmt17.pt --include onnx torchscript
+
+The exported file is written next to the weights (`.onnx` / `.torchscript`)
+and can be loaded with `FeatureExtractor(..., backend='onnx')` or
+`backend='torchscript'`, or passed as `--strong-sort-weights` to the
+tracking scripts. After export, the outputs of the exported model are
+compared against the eager model on a random batch.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[2]  # yolov5 strongsort root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+if str(FILE.parents[0] / 'reid') not in sys.path:
+    sys.path.append(str(FILE.parents[0] / 'reid'))  # add torchreid to PATH
+
+from strong_sort.deep.reid_model_factory import get_model_name, show_downloadeable_models
+from torchreid.utils import FeatureExtractor
+
+
+def export_onnx(model, file, image_size=(256, 128), opset=12):
+    """Exports `model` to ONNX with a dynamic batch dimension."""
+    dummy = torch.zeros(1, 3, *image_size)
+    torch.onnx.export(
+        model, dummy, str(file),
+        opset_version=opset,
+        input_names=['images'],
+        output_names=['features'],
+        dynamic_axes={'images': {0: 'batch'}, 'features': {0: 'batch'}},
+        do_constant_folding=True
+    )
+    return file
+
+
+def export_torchscript(model, file, image_size=(256, 128)):
+    """Exports `model` to TorchScript by tracing."""
+    dummy = torch.zeros(1, 3, *image_size)
+    traced = torch.jit.trace(model, dummy)
+    traced.save(str(file))
+    return file
+
+
+def check_export(model, file, backend, image_size=(256, 128), batch_size=4,
+                 atol=1e-3):
+    """Compares an exported model against the eager model on a random batch.
+
+    Returns the maximum absolute difference; raises if it exceeds `atol`.
+    """
+    extractor = FeatureExtractor(
+        model_path=file, image_size=image_size, device='cpu', verbose=False,
+        backend=backend
+    )
+    images = torch.rand(batch_size, 3, *image_size)
+    with torch.no_grad():
+        expected = model(images)
+    actual = extractor(images)
+    max_diff = (expected - actual).abs().max().item()
+    if not np.isfinite(max_diff) or max_diff > atol:
+        raise RuntimeError(
+            '{} export of {} does not match the eager model '
+            '(max abs diff {:.2e} > {:.0e})'.format(backend, file, max_diff, atol)
+        )
+    return max_diff
+
+
+def run(weights, include=('onnx',), image_size=(256, 128), opset=12, atol=1e-3):
+    weights = Path(weights)
+    model_name = get_model_name(weights)
+    if model_name is None:
+        print('Cannot infer the ReID architecture from {}. Choose between:'.format(weights.name))
+        show_downloadeable_models()
+        exit()
+
+    model = FeatureExtractor(
+        model_name=model_name, model_path=str(weights), image_size=image_size,
+        device='cpu', verbose=False
+    ).model
+
+    files = []
+    for fmt in include:
+        if fmt == 'onnx':
+            file = export_onnx(model, weights.with_suffix('.onnx'), image_size, opset)
+        elif fmt == 'torchscript':
+            file = export_torchscript(model, weights.with_suffix('.torchscript'), image_size)
+        else:
+            raise ValueError('Unknown export format: {}'.format(fmt))
+        max_diff = check_export(model, file, fmt, image_size, atol=atol)
+        print('{} export saved to {} (max abs diff vs eager: {:.2e})'.format(fmt, file, max_diff))
+        files.append(file)
+    return files
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weights', type=str, required=True, help='ReID model.pt path')
+    parser.add_argument('--include', nargs='+', default=['onnx'], help='onnx, torchscript')
+    parser.add_argument('--imgsz', nargs=2, type=int, default=[256, 128], help='input height, width')
+    parser.add_argument('--opset', type=int, default=12, help='ONNX opset version')
+    parser.add_argument('--atol', type=float, default=1e-3, help='max abs difference allowed vs eager')
+    opt = parser.parse_args()
+    return opt
+
+
+def main(opt):
+    run(opt.weights, opt.include, tuple(opt.imgsz), opt.opset, opt.atol)
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
@@ -100,6 +100,10 @@ def show_downloadeable_models():
     print(list(__trained_urls.keys()))
 
 
+def get_model_types():
+    return list(__model_types)
+
+
 def get_model_url(model):
     model = str(model).rsplit('/', 1)[-1]
     if model in __trained_urls:
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class ReIDServer(object):
+    """Shares one FeatureExtractor between several StrongSORT instances.
+
+    Each StrongSORT submits the boxes of its frame as a request. A worker
+    thread coalesces pending requests, from all sources, into a single
+    forward pass: it waits for the first request, then keeps collecting
+    until `max_batch` boxes are queued or `max_wait_ms` has passed, and
+    resolves one future per request with that request's features.
+
+    The server exposes `extract_boxes` so it can be passed as the
+    `extractor` of StrongSORT. Submitters have to run concurrently (e.g.
+    one thread per source) for their requests to end up in the same batch.
+
+    Args:
+        extractor (FeatureExtractor): the shared extractor.
+        max_batch (int): number of boxes that triggers a forward pass.
+        max_wait_ms (float): how long a request may wait for others to join
+            its batch.
+    """
+
+    def __init__(self, extractor, max_batch=64, max_wait_ms=2.):
+        self.extractor = extractor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._serve, daemon=True)
+        self._worker.start()
+
+    def submit(self, image, boxes):
+        """Queues the boxes of one image.
+
+        Args:
+            image (numpy.ndarray): image with shape (H, W, C).
+            boxes (numpy.ndarray): boxes with shape (B, 4) in
+                (x1, y1, x2, y2) pixel coordinates.
+
+        Returns:
+            Future: resolves to a torch.Tensor with shape (B, D).
+        """
+        future = Future()
+        self._queue.put((image, boxes, future))
+        return future
+
+    def extract_boxes(self, image, boxes):
+        return self.submit(image, boxes).result()
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self):
+        request = self._queue.get()
+        if request is None:
+            return None
+        batch, num_boxes = [request], len(request[1])
+        deadline = time.monotonic() + self.max_wait
+        while num_boxes < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                # serve what we have, stop on the next call
+                self._queue.put(None)
+                break
+            batch.append(request)
+            num_boxes += len(request[1])
+        return batch
+
+    def _serve(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                features = self.extractor.extract_batches(
+                    [(image, boxes) for image, boxes, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), f in zip(batch, features):
+                future.set_result(f)
+            self.batches += 1
+            self.requests += len(batch)
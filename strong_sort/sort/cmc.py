@@ -0,0 +1,253 @@
+# vim: expandtab:ts=4:sw=4
+import time
+import cv2
+import numpy as np
+
+
+CMC_METHODS = ('ecc', 'sparseOptFlow', 'orb', 'akaze')
+
+# Downscale ratio used by each method when none is given. ECC works on the
+# global intensity pattern and is happy with tiny images; keypoint methods
+# need enough texture left to find corners.
+_DEFAULT_SCALES = {
+    'ecc': 0.1,
+    'sparseOptFlow': 0.25,
+    'orb': 0.25,
+    'akaze': 0.25,
+}
+
+# Smallest share of `max_iter` / `max_features` the budget can cut down to.
+_MIN_LOAD = 1. / 16
+
+
+class CameraMotionCompensator(object):
+    """
+    Global camera motion estimation, run once per frame pair.
+
+    The warp between two consecutive frames is the same for every track, so
+    it is estimated a single time on downscaled grayscale images and then
+    applied to all track states at once (see `TrackStore.warp`). Per-frame
+    work (grayscale conversion, downscaling and, for keypoint methods,
+    feature extraction) is cached for the last frame, so when the current
+    frame is passed as `previous_img` on the next call it is not redone.
+
+    Available methods:
+
+    * ``ecc``: intensity-based ECC registration.
+    * ``sparseOptFlow``: Lucas-Kanade flow of good-features-to-track corners
+      followed by a RANSAC affine fit.
+    * ``orb`` / ``akaze``: keypoint matching followed by a RANSAC affine fit.
+
+    Regions covered by the given boxes (usually the tracked objects) are
+    excluded from the registration, so moving objects do not bias the
+    estimate of the background motion.
+
+    Parameters
+    ----------
+    method : str
+        One of `CMC_METHODS`.
+    scale : Optional[float]
+        Downscale ratio applied to the frames before registration. Defaults
+        to a per-method value.
+    budget_ms : Optional[float]
+        Per-frame time budget in milliseconds, enforced before the work is
+        done: the ECC iteration count and the number of corners/keypoints
+        are a share of `max_iter` / `max_features` that is halved after each
+        frame that overran the budget and grows back after frames that took
+        less than half of it, and the frame following an overrun is skipped
+        altogether. No motion (identity) is assumed for skipped frames and
+        for frames that still overrun.
+    warp_mode : int
+        OpenCV motion model for ECC, e.g. cv2.MOTION_TRANSLATION,
+        cv2.MOTION_EUCLIDEAN or cv2.MOTION_AFFINE.
+    eps : float
+        The threshold of the increment in the correlation coefficient between
+        two ECC iterations.
+    max_iter : int
+        The maximum number of ECC iterations.
+    max_features : int
+        The maximum number of corners (sparseOptFlow) or keypoints (orb,
+        akaze) per frame.
+    max_warp_norm : float
+        Warps whose distance to the identity (Frobenius norm) is larger than
+        this value are considered failed registrations and discarded.
+
+    """
+
+    def __init__(self, method='ecc', scale=None, budget_ms=None,
+                 warp_mode=cv2.MOTION_EUCLIDEAN, eps=1e-5, max_iter=100,
+                 max_features=1000, max_warp_norm=100):
+        if method not in CMC_METHODS:
+            raise ValueError(
+                "Invalid camera motion method; must be one of {}".format(CMC_METHODS))
+        self.method = method
+        self.scale = scale if scale is not None else _DEFAULT_SCALES[method]
+        self.budget_ms = budget_ms
+        self.warp_mode = warp_mode
+        self.eps = eps
+        self.max_iter = max_iter
+        self.max_features = max_features
+        self.max_warp_norm = max_warp_norm
+        self._load = 1.  # share of max_iter / max_features within budget
+        self._skip = False
+
+        if method == 'orb':
+            self._detector = cv2.ORB_create(nfeatures=max_features)
+        elif method == 'akaze':
+            self._detector = cv2.AKAZE_create()
+        else:
+            self._detector = None
+        if self._detector is not None:
+            self._matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        self._cache = {}
+
+    def _frame(self, img, boxes):
+        """Downscaled grayscale copy of `img` (and its keypoints for keypoint
+        methods), cached for the last frame seen."""
+        if self._cache.get('img') is img:
+            return self._cache
+        small = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        if self.scale != 1:
+            small = cv2.resize(small, (0, 0), fx=self.scale, fy=self.scale,
+                               interpolation=cv2.INTER_LINEAR)
+        self._cache = {'img': img, 'small': small, 'mask': self._mask(small.shape, boxes)}
+        if self._detector is not None:
+            n = self._features()
+            if self.method == 'orb':
+                self._detector.setMaxFeatures(n)
+            keypoints = self._detector.detect(small, self._cache['mask'])
+            if len(keypoints) > n:
+                keypoints = sorted(keypoints, key=lambda k: -k.response)[:n]
+            keypoints, descriptors = self._detector.compute(small, keypoints)
+            self._cache['keypoints'] = keypoints
+            self._cache['descriptors'] = descriptors
+        return self._cache
+
+    def _mask(self, shape, boxes):
+        """uint8 mask that is zero inside `boxes` (full-resolution tlbr)."""
+        mask = np.full(shape, 255, dtype=np.uint8)
+        if boxes is None or len(boxes) == 0:
+            return mask
+        boxes = np.asarray(boxes, dtype=float) * self.scale
+        boxes = np.round(boxes).astype(int)
+        boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, shape[1])
+        boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, shape[0])
+        for x1, y1, x2, y2 in boxes:
+            mask[y1:y2, x1:x2] = 0
+        return mask
+
+    def _out_of_budget(self, start):
+        return self.budget_ms is not None and \
+            (time.perf_counter() - start) * 1e3 > self.budget_ms
+
+    def _features(self):
+        return max(4, int(self.max_features * self._load))
+
+    def _criteria(self):
+        max_iter = max(1, int(self.max_iter * self._load))
+        return (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, max_iter, self.eps)
+
+    def _account(self, start):
+        """Adapts the work allowed on the next frames to the time spent on
+        this one. Returns True if the budget was overrun."""
+        if self.budget_ms is None:
+            return False
+        elapsed = (time.perf_counter() - start) * 1e3
+        if elapsed > self.budget_ms:
+            self._load = max(self._load / 2, _MIN_LOAD)
+            self._skip = True
+            return True
+        if elapsed < self.budget_ms / 2:
+            self._load = min(self._load * 1.25, 1.)
+        return False
+
+    def estimate(self, previous_img, current_img, boxes=None):
+        """Estimate the warp mapping `previous_img` onto `current_img`.
+
+        Parameters
+        ----------
+        previous_img : Optional[ndarray]
+            The previous frame (BGR or gray). None on the first frame.
+        current_img : ndarray
+            The current frame, in the same format as `previous_img`.
+        boxes : Optional[ndarray]
+            An Nx4 matrix of boxes `(min x, min y, max x, max y)` in
+            full-resolution pixels to exclude from the registration.
+
+        Returns
+        -------
+        Optional[ndarray]
+            The 2x3 affine warp in full-resolution pixel coordinates, or None
+            if there is no previous frame, the registration failed, it did
+            not finish within the time budget or the frame was skipped after
+            an overrun.
+
+        """
+        if previous_img is None or current_img is None:
+            return None
+        if previous_img.shape != current_img.shape:
+            return None
+        if self._skip:
+            self._skip = False
+            return None
+
+        start = time.perf_counter()
+        warp_matrix = self._estimate(previous_img, current_img, boxes, start)
+        if self._account(start) or warp_matrix is None:
+            return None
+
+        warp_matrix = warp_matrix.astype(np.float64)
+        warp_matrix[:, 2] /= self.scale
+        if np.linalg.norm(np.eye(2, 3) - warp_matrix) >= self.max_warp_norm:
+            return None
+        return warp_matrix
+
+    def _estimate(self, previous_img, current_img, boxes, start):
+        src = self._frame(previous_img, boxes)
+        dst = self._frame(current_img, boxes)
+        if self._out_of_budget(start):
+            return None
+        if self.method == 'ecc':
+            return self._ecc(src, dst)
+        if self.method == 'sparseOptFlow':
+            return self._sparse_optical_flow(src, dst, start)
+        return self._keypoints(src, dst, start)
+
+    def _ecc(self, src, dst):
+        warp_matrix = np.eye(2, 3, dtype=np.float32)
+        try:
+            _, warp_matrix = cv2.findTransformECC(
+                src['small'], dst['small'], warp_matrix, self.warp_mode,
+                self._criteria(), dst['mask'], 1)
+        except cv2.error:
+            return None
+        return warp_matrix
+
+    def _sparse_optical_flow(self, src, dst, start):
+        points = cv2.goodFeaturesToTrack(
+            src['small'], maxCorners=self._features(), qualityLevel=0.01, minDistance=1,
+            blockSize=3, mask=src['mask'], useHarrisDetector=False, k=0.04)
+        if points is None or len(points) < 4 or self._out_of_budget(start):
+            return None
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            src['small'], dst['small'], points, None)
+        status = status.ravel().astype(bool)
+        return self._fit_affine(points[status], next_points[status])
+
+    def _keypoints(self, src, dst, start):
+        if src['descriptors'] is None or dst['descriptors'] is None:
+            return None
+        matches = self._matcher.match(src['descriptors'], dst['descriptors'])
+        if len(matches) < 4 or self._out_of_budget(start):
+            return None
+        points = np.float32([src['keypoints'][m.queryIdx].pt for m in matches])
+        next_points = np.float32([dst['keypoints'][m.trainIdx].pt for m in matches])
+        return self._fit_affine(points, next_points)
+
+    @staticmethod
+    def _fit_affine(points, next_points):
+        if len(points) < 4:
+            return None
+        warp_matrix, _ = cv2.estimateAffinePartial2D(
+            points, next_points, method=cv2.RANSAC)
+        return warp_matrix
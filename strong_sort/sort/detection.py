@@ -14,6 +14,9 @@ class Detection(object):
         Detector confidence score.
     feature : array_like
         A feature vector that describes the object contained in this image.
+    feature_reused : Optional[bool]
+        True if `feature` is a cached track embedding rather than one
+        extracted from this detection.
 
     Attributes
     ----------
@@ -23,13 +26,16 @@ class Detection(object):
         Detector confidence score.
     feature : ndarray | NoneType
         A feature vector that describes the object contained in this image.
+    feature_reused : bool
+        True if `feature` is a cached track embedding.
 
     """
 
-    def __init__(self, tlwh, confidence, feature):
+    def __init__(self, tlwh, confidence, feature, feature_reused=False):
         self.tlwh = np.asarray(tlwh, dtype=float)
         self.confidence = float(confidence)
         self.feature = np.asarray(feature.cpu(), dtype=np.float32)
+        self.feature_reused = feature_reused
 
     def to_tlbr(self):
         """Convert bounding box to format `(min x, min y, max x, max y)`, i.e.,
@@ -1,9 +1,15 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
 import numpy as np
+from scipy.sparse import csr_matrix
 from . import linear_assignment
 
 
+# Above this many track/detection pairs `iou_cost` only evaluates pairs
+# whose boxes can overlap (see `overlapping_pairs`) instead of all of them.
+DENSE_IOU_MAX_PAIRS = 100000
+
+
 def iou(bbox, candidates):
     """Computer intersection over union.
 
@@ -39,6 +45,99 @@ def iou(bbox, candidates):
     return area_intersection / (area_bbox + area_candidates - area_intersection)
 
 
+def iou_matrix(bboxes, candidates):
+    """Compute the intersection over union of all pairs of boxes.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Nx4 matrix of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    candidates : ndarray
+        An Mx4 matrix of bounding boxes in the same format as `bboxes`.
+
+    Returns
+    -------
+    ndarray
+        An NxM matrix where element (i, j) is the intersection over union in
+        [0, 1] between `bboxes[i]` and `candidates[j]`.
+
+    """
+    bboxes_tl, bboxes_br = bboxes[:, None, :2], bboxes[:, None, :2] + bboxes[:, None, 2:]
+    candidates_tl = candidates[None, :, :2]
+    candidates_br = candidates[None, :, :2] + candidates[None, :, 2:]
+
+    wh = np.maximum(0., np.minimum(bboxes_br, candidates_br) - np.maximum(bboxes_tl, candidates_tl))
+    area_intersection = wh.prod(axis=2)
+    area_bboxes = bboxes[:, 2:].prod(axis=1)[:, None]
+    area_candidates = candidates[:, 2:].prod(axis=1)[None, :]
+    return area_intersection / (area_bboxes + area_candidates - area_intersection)
+
+
+def overlapping_pairs(bboxes, candidates):
+    """Compute the intersection over union of all overlapping pairs of boxes.
+
+    Candidates are sorted by their left edge, so the candidates that can
+    overlap a box form one contiguous run of the sorted order (sweep along
+    x). Only pairs in those runs are evaluated, which keeps the cost close to
+    the number of actually overlapping pairs for large, spread-out scenes.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Nx4 matrix of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    candidates : ndarray
+        An Mx4 matrix of bounding boxes in the same format as `bboxes`.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray)
+        Row indices into `bboxes`, column indices into `candidates` and the
+        intersection over union of every pair with non-zero overlap.
+
+    """
+    empty = np.empty(0, dtype=int)
+    if len(bboxes) == 0 or len(candidates) == 0:
+        return empty, empty, np.empty(0)
+
+    order = np.argsort(candidates[:, 0], kind='stable')
+    left = candidates[order, 0]
+    max_width = candidates[:, 2].max()
+    # A candidate overlaps box i along x only if
+    # bbox_x1 - max_width < cand_x1 < bbox_x2.
+    start = np.searchsorted(left, bboxes[:, 0] - max_width, side='right')
+    stop = np.searchsorted(left, bboxes[:, 0] + bboxes[:, 2], side='left')
+    counts = np.maximum(stop - start, 0)
+
+    rows = np.repeat(np.arange(len(bboxes)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cols = order[np.repeat(start, counts) + offsets]
+
+    a, b = bboxes[rows], candidates[cols]
+    wh = np.maximum(0., np.minimum(a[:, :2] + a[:, 2:], b[:, :2] + b[:, 2:]) -
+                    np.maximum(a[:, :2], b[:, :2]))
+    area_intersection = wh.prod(axis=1)
+    ious = area_intersection / (a[:, 2:].prod(axis=1) + b[:, 2:].prod(axis=1) - area_intersection)
+
+    keep = area_intersection > 0
+    return rows[keep], cols[keep], ious[keep]
+
+
+def sparse_iou(bboxes, candidates):
+    """Same as `iou_matrix`, but returned as a sparse matrix that only stores
+    overlapping pairs.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        An NxM sparse matrix of intersection over union values.
+
+    """
+    rows, cols, ious = overlapping_pairs(bboxes, candidates)
+    return csr_matrix((ious, (rows, cols)), shape=(len(bboxes), len(candidates)))
+
+
 def iou_cost(tracks, detections, track_indices=None,
              detection_indices=None):
     """An intersection over union distance metric.
@@ -69,14 +168,19 @@ def iou_cost(tracks, detections, track_indices=None,
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    for row, track_idx in enumerate(track_indices):
-        if tracks[track_idx].time_since_update > 1:
-            cost_matrix[row, :] = linear_assignment.INFTY_COST
-            continue
+    bboxes = np.asarray(
+        [tracks[i].to_tlwh() for i in track_indices]).reshape(-1, 4)
+    candidates = np.asarray(
+        [detections[i].tlwh for i in detection_indices]).reshape(-1, 4)
+
+    if len(bboxes) * len(candidates) <= DENSE_IOU_MAX_PAIRS:
+        cost_matrix = 1. - iou_matrix(bboxes, candidates)
+    else:
+        cost_matrix = np.ones((len(bboxes), len(candidates)))
+        rows, cols, ious = overlapping_pairs(bboxes, candidates)
+        cost_matrix[rows, cols] = 1. - ious
 
-        bbox = tracks[track_idx].to_tlwh()
-        candidates = np.asarray(
-            [detections[i].tlwh for i in detection_indices])
-        cost_matrix[row, :] = 1. - iou(bbox, candidates)
+    stale = np.asarray(
+        [tracks[i].time_since_update > 1 for i in track_indices], dtype=bool)
+    cost_matrix[stale, :] = linear_assignment.INFTY_COST
     return cost_matrix
@@ -18,6 +18,15 @@ chi2inv95 = {
     9: 16.919}
 
 
+def _batch_diag(values):
+    """Build a stack of diagonal matrices from an NxD matrix of diagonals."""
+    n, d = values.shape
+    out = np.zeros((n, d, d))
+    idx = np.arange(d)
+    out[:, idx, idx] = values
+    return out
+
+
 class KalmanFilter(object):
     """
     A simple Kalman filter for tracking bounding boxes in image space.
@@ -76,6 +85,35 @@ class KalmanFilter(object):
         covariance = np.diag(np.square(std))
         return mean, covariance
 
+    def multi_initiate(self, measurements):
+        """Create tracks from a batch of unassociated measurements.
+        Parameters
+        ----------
+        measurements : ndarray
+            The Nx4 dimensional matrix of bounding box coordinates (x, y, a, h)
+            with center position (x, y), aspect ratio a, and height h.
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx8 dimensional mean matrix and the Nx8x8 dimensional
+            covariance matrices of the new tracks. Unobserved velocities are
+            initialized to 0 mean.
+        """
+        measurements = np.asarray(measurements, dtype=float).reshape(-1, 4)
+        mean = np.c_[measurements, np.zeros_like(measurements)]
+
+        std = np.c_[
+            2 * self._std_weight_position * measurements[:, 0],
+            2 * self._std_weight_position * measurements[:, 1],
+            1 * measurements[:, 2],
+            2 * self._std_weight_position * measurements[:, 3],
+            10 * self._std_weight_velocity * measurements[:, 0],
+            10 * self._std_weight_velocity * measurements[:, 1],
+            0.1 * measurements[:, 2],
+            10 * self._std_weight_velocity * measurements[:, 3]]
+        covariance = _batch_diag(np.square(std))
+        return mean, covariance
+
     def predict(self, mean, covariance):
         """Run Kalman filter prediction step.
         Parameters
@@ -110,6 +148,39 @@ class KalmanFilter(object):
 
         return mean, covariance
 
+    def multi_predict(self, mean, covariance):
+        """Run Kalman filter prediction step (vectorized version).
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the object states at the
+            previous time step.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the object states at
+            the previous time step.
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the mean matrix and covariance matrices of the predicted
+            states.
+        """
+        std = np.c_[
+            self._std_weight_position * mean[:, 0],
+            self._std_weight_position * mean[:, 1],
+            1 * mean[:, 2],
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_velocity * mean[:, 0],
+            self._std_weight_velocity * mean[:, 1],
+            0.1 * mean[:, 2],
+            self._std_weight_velocity * mean[:, 3]]
+        motion_cov = _batch_diag(np.square(std))
+
+        mean = np.dot(mean, self._motion_mat.T)
+        covariance = np.matmul(
+            np.matmul(self._motion_mat, covariance), self._motion_mat.T) + motion_cov
+
+        return mean, covariance
+
     def project(self, mean, covariance, confidence=.0):
         """Project state distribution to measurement space.
         Parameters
@@ -141,6 +212,38 @@ class KalmanFilter(object):
             self._update_mat, covariance, self._update_mat.T))
         return mean, covariance + innovation_cov
 
+    def multi_project(self, mean, covariance, confidence=.0):
+        """Project state distributions to measurement space (vectorized
+        version).
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+        confidence : float | ndarray
+            Detection confidence, either a scalar or one value per state.
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 projected covariance
+            matrices of the given state estimates.
+        """
+        std = np.c_[
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_position * mean[:, 3],
+            np.full(len(mean), 1e-1),
+            self._std_weight_position * mean[:, 3]]
+
+        std = (1 - np.reshape(confidence, (-1, 1))) * std
+
+        innovation_cov = _batch_diag(np.square(std))
+
+        mean = np.dot(mean, self._update_mat.T)
+        covariance = np.matmul(
+            np.matmul(self._update_mat, covariance), self._update_mat.T)
+        return mean, covariance + innovation_cov
+
     def update(self, mean, covariance, measurement, confidence=.0):
         """Run Kalman filter correction step.
         Parameters
@@ -173,6 +276,38 @@ class KalmanFilter(object):
             kalman_gain, projected_cov, kalman_gain.T))
         return new_mean, new_covariance
 
+    def multi_update(self, mean, covariance, measurements, confidence=.0):
+        """Run Kalman filter correction step (vectorized version).
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the predicted states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the predicted states.
+        measurements : ndarray
+            The Nx4 dimensional matrix of measurements (x, y, a, h), one row
+            per state.
+        confidence : float | ndarray
+            Detection confidence, either a scalar or one value per state.
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions.
+        """
+        projected_mean, projected_cov = self.multi_project(
+            mean, covariance, confidence)
+
+        # K = P H^T S^-1, solved as S K^T = H P (S and P are symmetric).
+        kalman_gain = np.linalg.solve(
+            projected_cov, np.matmul(self._update_mat, covariance)
+        ).transpose(0, 2, 1)
+        innovation = measurements - projected_mean
+
+        new_mean = mean + np.einsum('nij,nj->ni', kalman_gain, innovation)
+        new_covariance = covariance - np.matmul(
+            np.matmul(kalman_gain, projected_cov), kalman_gain.transpose(0, 2, 1))
+        return new_mean, new_covariance
+
     def gating_distance(self, mean, covariance, measurements,
                         only_position=False):
         """Compute gating distance between state distribution and measurements.
@@ -211,4 +346,44 @@ class KalmanFilter(object):
             cholesky_factor, d.T, lower=True, check_finite=False,
             overwrite_b=True)
         squared_maha = np.sum(z * z, axis=0)
-        return squared_maha
\ No newline at end of file
+        return squared_maha
+
+    def multi_gating_distance(self, mean, covariance, measurements,
+                              only_position=False):
+        """Compute gating distance between a batch of state distributions and
+        measurements (vectorized version of `gating_distance`).
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the state distributions.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the state
+            distributions.
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements, each in
+            format (x, y, a, h) where (x, y) is the bounding box center
+            position, a the aspect ratio, and h the height.
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+        Returns
+        -------
+        ndarray
+            Returns an NxM matrix, where element (i, j) contains the squared
+            Mahalanobis distance between (mean[i], covariance[i]) and
+            `measurements[j]`.
+        """
+        measurements = np.asarray(measurements, dtype=float).reshape(-1, 4)
+        if len(mean) == 0 or len(measurements) == 0:
+            return np.zeros((len(mean), len(measurements)))
+        mean, covariance = self.multi_project(mean, covariance)
+
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        cholesky_factor = np.linalg.cholesky(covariance)
+        d = measurements[None, :, :] - mean[:, None, :]
+        z = np.linalg.solve(cholesky_factor, d.transpose(0, 2, 1))
+        squared_maha = np.sum(z * z, axis=1)
+        return squared_maha
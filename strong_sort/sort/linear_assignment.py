@@ -2,12 +2,93 @@
 from __future__ import absolute_import
 import numpy as np
 from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from . import kalman_filter
 
+try:
+    import lap  # optional Jonker-Volgenant solver, faster than scipy
+except ImportError:
+    lap = None
+
 
 INFTY_COST = 1e+5
 
 
+def _solve_block(cost_matrix):
+    """Solve a dense rectangular assignment problem, returning the assigned
+    row and column indices."""
+    if lap is not None:
+        _, x, _ = lap.lapjv(cost_matrix, extend_cost=True)
+        rows = np.flatnonzero(x >= 0)
+        return rows, x[rows]
+    return linear_sum_assignment(cost_matrix)
+
+
+def solve_gated_assignment(cost_matrix, max_distance):
+    """Solve the assignment problem restricted to feasible pairs.
+
+    Pairs with cost larger than `max_distance` can never be matched, so the
+    bipartite graph of feasible pairs is split into connected components and
+    each component is solved on its own. Components with a single track or
+    a single detection are matched greedily (which is optimal there); only
+    the remaining blocks go through a dense solver.
+
+    Parameters
+    ----------
+    cost_matrix : ndarray
+        The NxM dimensional cost matrix.
+    max_distance : float
+        Gating threshold. Associations with cost larger than this value are
+        disregarded.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        Row and column indices of the matched pairs, sorted by row. Every
+        returned pair has cost at most `max_distance`.
+    """
+    n_rows, n_cols = cost_matrix.shape
+    edge_rows, edge_cols = np.nonzero(cost_matrix <= max_distance)
+    if len(edge_rows) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    graph = coo_matrix(
+        (np.ones(len(edge_rows)), (edge_rows, edge_cols + n_rows)),
+        shape=(n_rows + n_cols, n_rows + n_cols))
+    _, labels = connected_components(graph, directed=False)
+    row_labels, col_labels = labels[:n_rows], labels[n_rows:]
+
+    # Group the rows/columns of each component that has at least one edge.
+    components = np.unique(row_labels[edge_rows])
+    row_order = np.argsort(row_labels, kind='stable')
+    col_order = np.argsort(col_labels, kind='stable')
+    row_bounds = np.searchsorted(row_labels[row_order], [components, components + 1])
+    col_bounds = np.searchsorted(col_labels[col_order], [components, components + 1])
+
+    matched_rows, matched_cols = [], []
+    for k in range(len(components)):
+        rows = row_order[row_bounds[0, k]:row_bounds[1, k]]
+        cols = col_order[col_bounds[0, k]:col_bounds[1, k]]
+        if len(rows) == 1:
+            matched_rows.append(rows[0])
+            matched_cols.append(cols[np.argmin(cost_matrix[rows[0], cols])])
+        elif len(cols) == 1:
+            matched_rows.append(rows[np.argmin(cost_matrix[rows, cols[0]])])
+            matched_cols.append(cols[0])
+        else:
+            block = np.minimum(cost_matrix[np.ix_(rows, cols)], max_distance + 1e-5)
+            block_rows, block_cols = _solve_block(block)
+            keep = block[block_rows, block_cols] <= max_distance
+            matched_rows.extend(rows[block_rows[keep]])
+            matched_cols.extend(cols[block_cols[keep]])
+
+    matched_rows = np.asarray(matched_rows, dtype=int)
+    matched_cols = np.asarray(matched_cols, dtype=int)
+    order = np.argsort(matched_rows)
+    return matched_rows[order], matched_cols[order]
+
+
 def min_cost_matching(
         distance_metric, max_distance, tracks, detections, track_indices=None,
         detection_indices=None):
@@ -51,24 +132,19 @@ def min_cost_matching(
 
     cost_matrix = distance_metric(
         tracks, detections, track_indices, detection_indices)
-    cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
-    row_indices, col_indices = linear_sum_assignment(cost_matrix)
-
-    matches, unmatched_tracks, unmatched_detections = [], [], []
-    for col, detection_idx in enumerate(detection_indices):
-        if col not in col_indices:
-            unmatched_detections.append(detection_idx)
-    for row, track_idx in enumerate(track_indices):
-        if row not in row_indices:
-            unmatched_tracks.append(track_idx)
-    for row, col in zip(row_indices, col_indices):
-        track_idx = track_indices[row]
-        detection_idx = detection_indices[col]
-        if cost_matrix[row, col] > max_distance:
-            unmatched_tracks.append(track_idx)
-            unmatched_detections.append(detection_idx)
-        else:
-            matches.append((track_idx, detection_idx))
+    row_indices, col_indices = solve_gated_assignment(cost_matrix, max_distance)
+
+    row_matched = np.zeros(len(track_indices), dtype=bool)
+    col_matched = np.zeros(len(detection_indices), dtype=bool)
+    row_matched[row_indices] = True
+    col_matched[col_indices] = True
+
+    matches = [(track_indices[row], detection_indices[col])
+               for row, col in zip(row_indices, col_indices)]
+    unmatched_tracks = [
+        track_idx for track_idx, matched in zip(track_indices, row_matched) if not matched]
+    unmatched_detections = [
+        detection_idx for detection_idx, matched in zip(detection_indices, col_matched) if not matched]
     return matches, unmatched_tracks, unmatched_detections
 
 
@@ -130,7 +206,7 @@ def matching_cascade(
 
 def gate_cost_matrix(
         cost_matrix, tracks, detections, track_indices, detection_indices,
-        gated_cost=INFTY_COST, only_position=False):
+        gated_cost=INFTY_COST, only_position=False, mc_lambda=0.995):
     """Invalidate infeasible entries in cost matrix based on the state
     distributions obtained by Kalman filtering.
     Parameters
@@ -157,6 +233,9 @@ def gate_cost_matrix(
     only_position : Optional[bool]
         If True, only the x, y position of the state distribution is considered
         during gating. Defaults to False.
+    mc_lambda : Optional[float]
+        Weight of the given (appearance) cost; the squared Mahalanobis
+        distance is blended in with weight `1 - mc_lambda`.
     Returns
     -------
     ndarray
@@ -164,11 +243,15 @@ def gate_cost_matrix(
     """
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return cost_matrix
     measurements = np.asarray(
         [detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = track.kf.gating_distance(track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
-        cost_matrix[row] = 0.995 * cost_matrix[row] + (1 - 0.995) *  gating_distance
+    kf = tracks[track_indices[0]].kf
+    gating_distance = kf.multi_gating_distance(
+        np.asarray([tracks[i].mean for i in track_indices]),
+        np.asarray([tracks[i].covariance for i in track_indices]),
+        measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = gated_cost
+    cost_matrix = mc_lambda * cost_matrix + (1 - mc_lambda) * gating_distance
     return cost_matrix
\ No newline at end of file
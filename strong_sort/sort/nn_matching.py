@@ -1,10 +1,14 @@
 # vim: expandtab:ts=4:sw=4
+import logging
 import numpy as np
 import sys
 import torch
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append('strong_sort/deep/reid')
 from torchreid.metrics.distance import compute_distance_matrix
 
+LOGGER = logging.getLogger(__name__)
+
 
 def _pdist(a, b):
     """Compute pair-wise squared distance between points in `a` and `b`.
@@ -93,10 +97,112 @@ def _nn_cosine_distance(x, y):
     return distances.min(axis=0)
 
 
+def _normalize(x):
+    """Scale the rows of `x` to unit length (zero rows are left untouched)."""
+    x = np.asarray(x, dtype=np.float32)
+    norm = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norm, np.finfo(np.float32).eps)
+
+
+def _kmeans(x, k, n_iter=10, seed=0):
+    """Lloyd's k-means on the rows of `x`; returns a kxM matrix of centroids."""
+    rng = np.random.RandomState(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(n_iter):
+        assignment = _pdist(x, centroids).argmin(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, x)
+        counts = np.bincount(assignment, minlength=k)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return centroids
+
+
+class _ProductQuantizer(object):
+    """
+    Product quantizer for unit-length features. A feature is split into
+    `n_subspaces` chunks and each chunk is stored as the index (uint8) of its
+    nearest centroid in that subspace's codebook of up to 256 centroids.
+
+    Parameters
+    ----------
+    samples : ndarray
+        An NxD matrix of training samples; D must be divisible by
+        `n_subspaces`.
+    n_subspaces : int
+        Number of subspaces, i.e. bytes per stored feature.
+
+    """
+
+    def __init__(self, samples, n_subspaces):
+        dim = samples.shape[1]
+        if dim % n_subspaces != 0:
+            raise ValueError(
+                "Feature dimension %d is not divisible by %d PQ subspaces"
+                % (dim, n_subspaces))
+        self.n_subspaces = n_subspaces
+        self.sub_dim = dim // n_subspaces
+        n_centroids = min(256, len(samples))
+        self.codebooks = np.stack([
+            _kmeans(chunk, n_centroids) for chunk in self._split(samples)])
+
+    def _split(self, x):
+        return x.reshape(len(x), self.n_subspaces, self.sub_dim).transpose(1, 0, 2)
+
+    def encode(self, x):
+        """Returns the NxM uint8 codes of the NxD matrix `x`."""
+        codes = [_pdist(chunk, codebook).argmin(axis=1)
+                 for chunk, codebook in zip(self._split(x), self.codebooks)]
+        return np.stack(codes, axis=1).astype(np.uint8)
+
+    def decode(self, codes):
+        """Returns the NxD reconstruction of the NxM `codes`."""
+        chunks = self.codebooks[np.arange(self.n_subspaces), codes]
+        return chunks.reshape(len(codes), -1)
+
+    def similarity(self, codes, queries):
+        """Asymmetric dot products between encoded samples and raw queries.
+
+        One lookup table of query-to-centroid dot products is built per
+        subspace; the similarity of a sample is the sum of its M table
+        entries.
+
+        Returns
+        -------
+        ndarray
+            A matrix of shape len(codes), len(queries).
+        """
+        tables = np.einsum(
+            'mnd,mkd->mkn', self._split(queries), self.codebooks)
+        similarity = np.zeros((len(codes), len(queries)), dtype=np.float32)
+        for m, table in enumerate(tables):
+            similarity += table[codes[:, m]]
+        return similarity
+
+
 class NearestNeighborDistanceMetric(object):
     """
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
+
+    Samples are kept L2-normalized in one contiguous ring-buffer gallery of
+    shape (max_targets, budget, D); each target owns one slot (first axis)
+    and its oldest sample is overwritten once the budget is reached. A
+    distance query is a single matrix product between the queried targets'
+    slots and the features, followed by a per-slot minimum.
+
+    The gallery can be stored compactly: as float16, or as product-quantized
+    codes ("pq", `pq_subspaces` bytes per sample instead of 4 bytes per
+    dimension). PQ codebooks are trained with k-means on a reservoir sample
+    of `pq_train_size` of all features passed to `partial_fit`, including
+    those of targets that have since been dropped. Training starts once that
+    many features have been seen and runs on a background thread; the
+    gallery stays float32 until the codebooks are ready and is re-encoded on
+    the next `partial_fit`. `train_pq` trains right away on the features
+    seen so far, and `active_storage` tells which storage is in use.
+    Distances to PQ codes are computed with per-query lookup tables
+    (asymmetric distance), so features are never decoded.
+
     Parameters
     ----------
     metric : str
@@ -107,24 +213,170 @@ class NearestNeighborDistanceMetric(object):
     budget : Optional[int]
         If not None, fix samples per class to at most this number. Removes
         the oldest samples when the budget is reached.
+    storage : Optional[str]
+        Gallery storage, one of "float32", "float16" or "pq".
+    pq_subspaces : Optional[int]
+        Number of PQ subspaces (bytes per sample); must divide the feature
+        dimension.
+    pq_train_size : Optional[int]
+        Number of samples the PQ codebooks are trained on.
+    pq_seed : Optional[int]
+        Seed of the reservoir sampling.
     Attributes
     ----------
-    samples : Dict[int -> List[ndarray]]
-        A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+    samples : Dict[int -> ndarray]
+        A dictionary that maps from target identities to the samples that have
+        been observed so far, oldest first (built on access).
     """
 
-    def __init__(self, metric, matching_threshold, budget=None):
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+    def __init__(self, metric, matching_threshold, budget=None,
+                 storage="float32", pq_subspaces=32, pq_train_size=4096,
+                 pq_seed=0):
+        if metric not in ("euclidean", "cosine"):
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
+        if storage not in ("float32", "float16", "pq"):
+            raise ValueError(
+                "Invalid storage; must be one of 'float32', 'float16' or 'pq'")
+        self.metric = metric
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+        self.storage = storage
+        self.pq_subspaces = pq_subspaces
+        self.pq_train_size = pq_train_size
+        self._pq = None  # _ProductQuantizer, once trained
+        self._pq_executor = None
+        self._pq_future = None  # training in progress
+        self._reservoir = None  # (pq_train_size, D) training samples
+        self._seen = 0  # features offered to the reservoir
+        self._rng = np.random.RandomState(pq_seed)
+
+        self._gallery = None  # (max_targets, budget, D), allocated lazily
+        self._counts = np.zeros(0, dtype=np.int64)  # valid samples per slot
+        self._heads = np.zeros(0, dtype=np.int64)  # next write position per slot
+        self._slots = {}  # target -> slot
+        self._free = []
+
+    @property
+    def samples(self):
+        samples = {}
+        for target, slot in self._slots.items():
+            count, head = self._counts[slot], self._heads[slot]
+            order = (np.arange(count) + head - count) % self._gallery.shape[1]
+            samples[target] = self._decode(self._gallery[slot, order])
+        return samples
+
+    def _encode(self, features):
+        if self._pq is not None:
+            return self._pq.encode(features)
+        return features.astype(self._gallery.dtype)
+
+    def _decode(self, entries):
+        if self._pq is not None:
+            return self._pq.decode(entries)
+        return entries.astype(np.float32)
+
+    def _similarity(self, entries, features):
+        if self._pq is not None:
+            return self._pq.similarity(entries, features)
+        return np.dot(entries.astype(np.float32), features.T)
+
+    @property
+    def active_storage(self):
+        """The storage the gallery is in right now: "pq" only once the
+        codebooks are trained, "float32" before that."""
+        if self._pq is not None:
+            return "pq"
+        return "float16" if self.storage == "float16" else "float32"
+
+    def _sample(self, features):
+        """Reservoir sampling (algorithm R) of the PQ training set."""
+        if self._reservoir is None:
+            self._reservoir = np.zeros(
+                (self.pq_train_size, features.shape[1]), dtype=np.float32)
+        seen = self._seen + np.arange(len(features))
+        rows = np.where(
+            seen < self.pq_train_size, seen, self._rng.randint(0, seen + 1))
+        kept = rows < self.pq_train_size
+        self._reservoir[rows[kept]] = features[kept]
+        self._seen += len(features)
+
+    def _maybe_train_pq(self):
+        """Start training the PQ codebooks in the background once the
+        reservoir is full, and switch to them once they are ready."""
+        if self._pq_future is None:
+            if self._seen >= self.pq_train_size:
+                LOGGER.info(
+                    "Training PQ codebooks on %d of %d features",
+                    self.pq_train_size, self._seen)
+                self._pq_executor = ThreadPoolExecutor(max_workers=1)
+                self._pq_future = self._pq_executor.submit(
+                    _ProductQuantizer, self._reservoir, self.pq_subspaces)
+        elif self._pq_future.done():
+            self._use_pq(self._pq_future.result())
+
+    def train_pq(self):
+        """Train the PQ codebooks now, on the features seen so far, and
+        re-encode the gallery with them. Waits for a training that is
+        already running instead."""
+        if self.storage != "pq" or self._pq is not None:
+            return
+        if self._pq_future is not None:
+            self._use_pq(self._pq_future.result())
+        elif self._seen:
+            samples = self._reservoir[:min(self._seen, self.pq_train_size)]
+            self._use_pq(_ProductQuantizer(samples, self.pq_subspaces))
+
+    def _use_pq(self, pq):
+        capacity, depth = self._gallery.shape[:2]
+        stored = np.arange(depth)[None, :] < self._counts[:, None]
+        codes = np.zeros((capacity, depth, pq.n_subspaces), dtype=np.uint8)
+        codes[stored] = pq.encode(self._gallery[stored])
+        self._gallery = codes
+        self._pq = pq
+        self._reservoir = None
+        if self._pq_executor is not None:
+            self._pq_executor.shutdown(wait=False)
+            self._pq_executor = self._pq_future = None
+        LOGGER.info(
+            "Appearance gallery switched to PQ storage (%d bytes per sample)",
+            pq.n_subspaces)
+
+    def _reserve(self, n_targets, n_samples, dim):
+        """Grow the gallery to hold at least `n_targets` slots of
+        `n_samples` samples each."""
+        if self._gallery is None:
+            depth = self.budget if self.budget is not None else max(n_samples, 1)
+            dtype = np.float16 if self.storage == "float16" else np.float32
+            self._gallery = np.zeros((max(n_targets, 16), depth, dim), dtype=dtype)
+            self._counts = np.zeros(len(self._gallery), dtype=np.int64)
+            self._heads = np.zeros(len(self._gallery), dtype=np.int64)
+            self._free = list(range(len(self._gallery) - 1, -1, -1))
+            return
+        capacity, depth = self._gallery.shape[:2]
+        if n_targets <= capacity and n_samples <= depth:
+            return
+        new_capacity = max(capacity, n_targets) if n_targets <= capacity \
+            else max(2 * capacity, n_targets)
+        new_depth = depth if n_samples <= depth else max(2 * depth, n_samples)
+        gallery = np.zeros(
+            (new_capacity, new_depth) + self._gallery.shape[2:], dtype=self._gallery.dtype)
+        gallery[:capacity, :depth] = self._gallery
+        self._gallery = gallery
+        self._counts = np.r_[self._counts, np.zeros(new_capacity - capacity, dtype=np.int64)]
+        self._heads = np.r_[self._heads, np.zeros(new_capacity - capacity, dtype=np.int64)]
+        if new_depth != depth:
+            # Only happens without a budget, where a slot is never overwritten,
+            # so samples sit at positions [0, count) and writing resumes at
+            # `count` (the head of a full slot has wrapped around to 0).
+            self._heads = self._counts.copy()
+        self._free = list(range(new_capacity - 1, capacity - 1, -1)) + self._free
+
+    def _release(self, target):
+        slot = self._slots.pop(target)
+        self._counts[slot] = 0
+        self._heads[slot] = 0
+        self._free.append(slot)
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -137,11 +389,43 @@ class NearestNeighborDistanceMetric(object):
         active_targets : List[int]
             A list of targets that are currently present in the scene.
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget:]
-        self.samples = {k: self.samples[k] for k in active_targets}
+        active = set(active_targets)
+        for target in [t for t in self._slots if t not in active]:
+            self._release(target)
+        if len(features) == 0:
+            return
+
+        features = _normalize(features)
+        targets = np.asarray(targets)
+        new_targets = [t for t in dict.fromkeys(targets.tolist()) if t not in self._slots]
+        needed = 0
+        if self.budget is None:
+            # Without a budget every sample is kept, so a slot must fit its
+            # current samples plus all samples added in this call.
+            unique_targets, per_target = np.unique(targets, return_counts=True)
+            needed = max(
+                n + (self._counts[self._slots[t]] if t in self._slots else 0)
+                for t, n in zip(unique_targets.tolist(), per_target))
+        self._reserve(len(self._slots) + len(new_targets), needed, features.shape[1])
+        for target in new_targets:
+            self._slots[target] = self._free.pop()
+
+        if self.storage == "pq" and self._pq is None:
+            if self._pq_future is None:
+                self._sample(features)
+            self._maybe_train_pq()
+        slots = np.array([self._slots[t] for t in targets.tolist()], dtype=np.int64)
+        depth = self._gallery.shape[1]
+        features = self._encode(features)
+        if len(np.unique(slots)) == len(slots):
+            self._gallery[slots, self._heads[slots]] = features
+            self._heads[slots] = (self._heads[slots] + 1) % depth
+            self._counts[slots] = np.minimum(self._counts[slots] + 1, depth)
+        else:
+            for feature, slot in zip(features, slots):
+                self._gallery[slot, self._heads[slot]] = feature
+                self._heads[slot] = (self._heads[slot] + 1) % depth
+                self._counts[slot] = min(self._counts[slot] + 1, depth)
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -158,7 +442,19 @@ class NearestNeighborDistanceMetric(object):
             element (i, j) contains the closest squared distance between
             `targets[i]` and `features[j]`.
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
\ No newline at end of file
+        if len(targets) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+        slots = np.array([self._slots[t] for t in targets], dtype=np.int64)
+        # Slots fill from position 0 until they wrap, so rows past the
+        # largest count are empty for every queried target.
+        depth = int(self._counts[slots].max())
+        gallery = self._gallery[slots, :depth].reshape(len(slots) * depth, -1)
+        similarity = self._similarity(gallery, _normalize(features)).reshape(
+            len(slots), depth, len(features))
+        if self.metric == "cosine":
+            distances = 1. - similarity
+        else:
+            distances = np.maximum(0., 2. - 2. * similarity)
+        empty = np.arange(depth)[None, :] >= self._counts[slots][:, None]
+        distances[empty] = np.inf
+        return distances.min(axis=1).astype(np.float64)
@@ -0,0 +1,85 @@
+# vim: expandtab:ts=4:sw=4
+import numpy as np
+
+
+class ReIDRefreshScheduler(object):
+    """
+    Decides which detections get a fresh appearance embedding.
+
+    Every detection that lies in the gate of a confirmed track is handled
+    here, with that track (its unambiguous owner in lazy ReID mode, the
+    nearest confirmed track otherwise) as reference. A detection is due for
+    extraction when the reference track's embedding is `stride` or more
+    frames old, or when the box has changed height or aspect ratio by more
+    than `max_change` (relative) since that embedding was extracted.
+    Contested detections, i.e. ambiguous ones in lazy ReID mode, are always
+    due. If more detections are due than the per-frame `budget` allows,
+    contested ones go first, then the ones with the stalest reference
+    embeddings; the rest fall back to the reference track's embedding.
+
+    Detections outside the gate of every confirmed track (new objects) are
+    always extracted and do not count against the budget.
+
+    Parameters
+    ----------
+    stride : Optional[int]
+        Maximum embedding age in frames. If None, embeddings are only
+        refreshed on box changes.
+    max_change : Optional[float]
+        Relative change in box height or aspect ratio that triggers a
+        refresh. If None, box changes are ignored.
+    budget : Optional[int]
+        Maximum number of extractions per frame among gated detections. If
+        None, all due detections are extracted.
+
+    """
+
+    def __init__(self, stride=None, max_change=0.2, budget=None):
+        self.stride = stride
+        self.max_change = max_change
+        self.budget = budget
+
+    def select(self, tracks, bbox_tlwh, contested=None):
+        """Select the detections to extract.
+
+        Parameters
+        ----------
+        tracks : List[track.Track]
+            The reference track of each gated detection.
+        bbox_tlwh : ndarray
+            An Nx4 matrix of the gated detections, row i belonging to
+            `tracks[i]`, in format `(top left x, top left y, width, height)`.
+        contested : Optional[ndarray]
+            A boolean array of length N, True for detections that always
+            need a fresh embedding.
+
+        Returns
+        -------
+        ndarray
+            A boolean array of length N, True where the embedding should be
+            extracted from the detection rather than taken from the track.
+
+        """
+        due = np.zeros(len(tracks), dtype=bool)
+        if len(tracks) == 0:
+            return due
+        bbox_tlwh = np.asarray(bbox_tlwh, dtype=float).reshape(-1, 4)
+        staleness = np.array([t.time_since_feature for t in tracks])
+        contested = due.copy() if contested is None else np.asarray(contested, dtype=bool)
+        due |= contested
+
+        if self.stride is not None:
+            due |= staleness >= self.stride
+        if self.max_change is not None:
+            reference = np.asarray([t.feature_tlwh for t in tracks], dtype=float)
+            scale = bbox_tlwh[:, 3] / reference[:, 3]
+            aspect = (bbox_tlwh[:, 2] / bbox_tlwh[:, 3]) / (reference[:, 2] / reference[:, 3])
+            due |= np.abs(scale - 1) > self.max_change
+            due |= np.abs(aspect - 1) > self.max_change
+
+        if self.budget is not None and due.sum() > self.budget:
+            candidates = np.flatnonzero(due)
+            order = np.lexsort((-staleness[candidates], ~contested[candidates]))
+            due[:] = False
+            due[candidates[order[:self.budget]]] = True
+        return due
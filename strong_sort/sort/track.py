@@ -1,7 +1,7 @@
 # vim: expandtab:ts=4:sw=4
 import cv2
 import numpy as np
-from strong_sort.sort.kalman_filter import KalmanFilter
+from strong_sort.sort.track_store import TrackStore
 
 
 class TrackState:
@@ -43,13 +43,20 @@ class Track:
     feature : Optional[ndarray]
         Feature vector of the detection this track originates from. If not None,
         this feature is added to the `features` cache.
+    store : Optional[track_store.TrackStore]
+        The store holding the Kalman filter state of this track. If None, a
+        private single-track store is created.
+    slot : Optional[int]
+        Row of `store` that already holds the initial state of this track.
+        If None, a row is allocated and initiated from `detection`.
 
     Attributes
     ----------
     mean : ndarray
-        Mean vector of the initial state distribution.
+        Mean vector of the state distribution (a view onto `store.mean`).
     covariance : ndarray
-        Covariance matrix of the initial state distribution.
+        Covariance matrix of the state distribution (a view onto
+        `store.covariance`).
     track_id : int
         A unique track identifier.
     hits : int
@@ -63,11 +70,16 @@ class Track:
     features : List[ndarray]
         A cache of features. On each measurement update, the associated feature
         vector is added to this list.
+    time_since_feature : int
+        Number of frames since a feature was last extracted for this track
+        (reused features do not count).
+    feature_tlwh : ndarray
+        Bounding box of the detection the last extracted feature came from.
 
     """
 
     def __init__(self, detection, track_id, class_id, conf, n_init, max_age, ema_alpha,
-                 feature=None):
+                 feature=None, store=None, slot=None):
         self.track_id = track_id
         self.class_id = int(class_id)
         self.hits = 1
@@ -85,8 +97,32 @@ class Track:
         self._n_init = n_init
         self._max_age = max_age
 
-        self.kf = KalmanFilter()
-        self.mean, self.covariance = self.kf.initiate(detection)
+        if store is None:
+            store = TrackStore(capacity=1)
+        if slot is None:
+            slot = store.initiate(np.asarray(detection)[None])[0]
+        self.store = store
+        self.slot = int(slot)
+        self.kf = store.kf
+
+        self.time_since_feature = 0
+        self.feature_tlwh = self.to_tlwh()
+
+    @property
+    def mean(self):
+        return self.store.mean[self.slot]
+
+    @mean.setter
+    def mean(self, value):
+        self.store.mean[self.slot] = value
+
+    @property
+    def covariance(self):
+        return self.store.covariance[self.slot]
+
+    @covariance.setter
+    def covariance(self, value):
+        self.store.covariance[self.slot] = value
 
     def to_tlwh(self):
         """Get current position in bounding box format `(top left x, top left y,
@@ -245,6 +281,7 @@ class Track:
     def increment_age(self):
         self.age += 1
         self.time_since_update += 1
+        self.time_since_feature += 1
 
     def predict(self, kf):
         """Propagate the state distribution to the current time step using a
@@ -256,9 +293,10 @@ class Track:
             The Kalman filter.
 
         """
-        self.mean, self.covariance = self.kf.predict(self.mean, self.covariance)
+        self.store.predict([self.slot])
         self.age += 1
         self.time_since_update += 1
+        self.time_since_feature += 1
 
     def update(self, detection, class_id, conf):
         """Perform Kalman filter measurement update step and update the feature
@@ -268,9 +306,23 @@ class Track:
         detection : Detection
             The associated detection.
         """
+        self.store.update([self.slot], detection.to_xyah(), detection.confidence)
+        self.update_state(detection, class_id, conf)
+
+    def update_state(self, detection, class_id, conf):
+        """Update the feature cache and track bookkeeping after the Kalman
+        filter state of this track has been corrected with `detection`
+        (e.g. by a batched `TrackStore.update`).
+        Parameters
+        ----------
+        detection : Detection
+            The associated detection.
+        """
         self.conf = conf
         self.class_id = class_id.int()
-        self.mean, self.covariance = self.kf.update(self.mean, self.covariance, detection.to_xyah(), detection.confidence)
+        if not detection.feature_reused:
+            self.time_since_feature = 0
+            self.feature_tlwh = detection.tlwh.copy()
 
         feature = detection.feature / np.linalg.norm(detection.feature)
 
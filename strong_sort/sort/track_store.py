@@ -0,0 +1,170 @@
+# vim: expandtab:ts=4:sw=4
+import numpy as np
+from .kalman_filter import KalmanFilter
+
+
+class TrackStore(object):
+    """
+    Structure-of-arrays storage for the Kalman filter state of all tracks.
+
+    Means and covariances of every live track are kept in two stacked arrays
+    so that prediction, projection and correction can run as single
+    vectorized calls instead of one small matrix product per track. Each
+    `Track` owns one row (its `slot`) and reads/writes its state through
+    views onto that row. Freed slots are recycled; the arrays grow
+    geometrically when they run out of rows.
+
+    Parameters
+    ----------
+    kf : Optional[kalman_filter.KalmanFilter]
+        The Kalman filter shared by all tracks in this store.
+    capacity : int
+        Number of rows to preallocate.
+
+    Attributes
+    ----------
+    kf : kalman_filter.KalmanFilter
+        The Kalman filter shared by all tracks in this store.
+    mean : ndarray
+        A (capacity, 8) matrix of state means, one row per slot.
+    covariance : ndarray
+        A (capacity, 8, 8) array of state covariances, one matrix per slot.
+
+    """
+
+    def __init__(self, kf=None, capacity=64):
+        self.kf = kf if kf is not None else KalmanFilter()
+        capacity = max(int(capacity), 1)
+        self.mean = np.zeros((capacity, 8))
+        self.covariance = np.zeros((capacity, 8, 8))
+        self._active = np.zeros(capacity, dtype=bool)
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return int(self._active.sum())
+
+    @property
+    def capacity(self):
+        return len(self._active)
+
+    @property
+    def active_slots(self):
+        """Slots currently holding a live track, in ascending order."""
+        return np.flatnonzero(self._active)
+
+    def _grow(self, min_capacity):
+        old = self.capacity
+        new = max(2 * old, min_capacity)
+        mean = np.zeros((new, 8))
+        covariance = np.zeros((new, 8, 8))
+        active = np.zeros(new, dtype=bool)
+        mean[:old], covariance[:old], active[:old] = \
+            self.mean, self.covariance, self._active
+        self.mean, self.covariance, self._active = mean, covariance, active
+        self._free = list(range(new - 1, old - 1, -1)) + self._free
+
+    def allocate(self, n):
+        """Reserve `n` slots and return their indices."""
+        if n > len(self._free):
+            self._grow(self.capacity + n - len(self._free))
+        slots = np.array([self._free.pop() for _ in range(n)], dtype=int)
+        self._active[slots] = True
+        return slots
+
+    def release(self, slots):
+        """Return slots to the free list once their tracks are deleted."""
+        for slot in np.atleast_1d(slots):
+            if self._active[slot]:
+                self._active[slot] = False
+                self._free.append(int(slot))
+
+    def initiate(self, measurements):
+        """Create new track states from unassociated measurements.
+
+        Parameters
+        ----------
+        measurements : ndarray
+            An Nx4 matrix of bounding boxes in format (x, y, a, h).
+
+        Returns
+        -------
+        ndarray
+            The slots holding the new states, in measurement order.
+
+        """
+        mean, covariance = self.kf.multi_initiate(measurements)
+        slots = self.allocate(len(mean))
+        self.mean[slots], self.covariance[slots] = mean, covariance
+        return slots
+
+    def predict(self, slots=None):
+        """Run the Kalman filter prediction step on `slots` (defaults to all
+        live tracks).
+        """
+        if slots is None:
+            slots = self.active_slots
+        if len(slots) == 0:
+            return
+        self.mean[slots], self.covariance[slots] = self.kf.multi_predict(
+            self.mean[slots], self.covariance[slots])
+
+    def project(self, slots, confidence=.0):
+        """Project the states in `slots` to measurement space.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            The Nx4 projected means and Nx4x4 projected covariances.
+
+        """
+        return self.kf.multi_project(
+            self.mean[slots], self.covariance[slots], confidence)
+
+    def update(self, slots, measurements, confidence=.0):
+        """Run the Kalman filter correction step on `slots`, where row i of
+        `measurements` is associated with `slots[i]`.
+        """
+        if len(slots) == 0:
+            return
+        self.mean[slots], self.covariance[slots] = self.kf.multi_update(
+            self.mean[slots], self.covariance[slots],
+            np.asarray(measurements, dtype=float).reshape(-1, 4), confidence)
+
+    def warp(self, slots, warp_matrix):
+        """Apply a global camera motion to the states in `slots`.
+
+        The box corners are mapped through the affine `warp_matrix` and the
+        position/velocity blocks of the covariances are rotated by its linear
+        part.
+
+        Parameters
+        ----------
+        slots : array_like
+            The slots to update.
+        warp_matrix : ndarray
+            A 2x3 affine warp from the previous to the current frame.
+
+        """
+        if len(slots) == 0:
+            return
+        slots = np.asarray(slots, dtype=int)
+        linear, shift = warp_matrix[:, :2], warp_matrix[:, 2]
+        mean = self.mean[slots]
+
+        w, h = mean[:, 2] * mean[:, 3], mean[:, 3]
+        tl = np.c_[mean[:, 0] - w / 2, mean[:, 1] - h / 2]
+        br = tl + np.c_[w, h]
+        tl = np.dot(tl, linear.T) + shift
+        br = np.dot(br, linear.T) + shift
+        wh = br - tl
+        mean[:, :2] = tl + wh / 2
+        mean[:, 2] = wh[:, 0] / wh[:, 1]
+        mean[:, 3] = wh[:, 1]
+        mean[:, 4:6] = np.dot(mean[:, 4:6], linear.T)
+        self.mean[slots] = mean
+
+        transform = np.eye(8)
+        transform[:2, :2] = linear
+        transform[4:6, 4:6] = linear
+        self.covariance[slots] = np.matmul(
+            np.matmul(transform, self.covariance[slots]), transform.T)
@@ -5,6 +5,8 @@ from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
 from .track import Track
+from .track_store import TrackStore
+from .cmc import CameraMotionCompensator
 
 
 class Tracker:
@@ -20,6 +22,13 @@ class Tracker:
         Number of consecutive detections before the track is confirmed. The
         track state is set to `Deleted` if a miss occurs within the first
         `n_init` frames.
+    cmc_method : str
+        Camera motion compensation backend, one of `cmc.CMC_METHODS`, or
+        "none" to leave track states unwarped. "none" is the default since
+        it keeps the tracking output of earlier versions, whose ECC step
+        never applied its warp.
+    cmc_budget_ms : Optional[float]
+        Per-frame time budget of the camera motion compensation.
     Attributes
     ----------
     metric : nn_matching.NearestNeighborDistanceMetric
@@ -30,12 +39,21 @@ class Tracker:
         Number of frames that a track remains in initialization phase.
     kf : kalman_filter.KalmanFilter
         A Kalman filter to filter target trajectories in image space.
+    store : track_store.TrackStore
+        Stacked Kalman filter state of all tracks; each track is a view onto
+        one row.
+    cmc : Optional[cmc.CameraMotionCompensator]
+        Estimates one global camera motion per frame for `camera_update`;
+        None with `cmc_method="none"`.
     tracks : List[Track]
         The list of active tracks at the current time step.
+    deleted_tracks : List[int]
+        The IDs of the tracks deleted in the current time step.
     """
     GATING_THRESHOLD = np.sqrt(kalman_filter.chi2inv95[4])
 
-    def __init__(self, metric, max_iou_distance=0.9, max_age=30, n_init=3, _lambda=0, ema_alpha=0.9, mc_lambda=0.995):
+    def __init__(self, metric, max_iou_distance=0.9, max_age=30, n_init=3, _lambda=0, ema_alpha=0.9, mc_lambda=0.995,
+                 cmc_method='none', cmc_budget_ms=None):
         self.metric = metric
         self.max_iou_distance = max_iou_distance
         self.max_age = max_age
@@ -45,7 +63,11 @@ class Tracker:
         self.mc_lambda = mc_lambda
 
         self.kf = kalman_filter.KalmanFilter()
+        self.store = TrackStore(self.kf)
+        self.cmc = None if cmc_method == 'none' else \
+            CameraMotionCompensator(cmc_method, budget_ms=cmc_budget_ms)
         self.tracks = []
+        self.deleted_tracks = []
         self._next_id = 1
 
     def predict(self):
@@ -53,17 +75,113 @@ class Tracker:
 
         This function should be called once every time step, before `update`.
         """
+        self.deleted_tracks = []
+        self.store.predict([t.slot for t in self.tracks])
         for track in self.tracks:
-            track.predict(self.kf)
+            track.age += 1
+            track.time_since_update += 1
+            track.time_since_feature += 1
 
     def increment_ages(self):
+        self.deleted_tracks = []
         for track in self.tracks:
             track.increment_age()
             track.mark_missed()
 
     def camera_update(self, previous_img, current_img):
-        for track in self.tracks:
-            track.camera_update(previous_img, current_img)
+        """Compensate camera motion between two consecutive frames.
+
+        The warp is estimated once for the frame pair, ignoring the areas
+        covered by the tracked objects, and applied to all tracks in one
+        vectorized step.
+        """
+        if self.cmc is None or not self.tracks:
+            return
+        boxes = np.asarray([t.to_tlbr() for t in self.tracks])
+        warp_matrix = self.cmc.estimate(previous_img, current_img, boxes)
+        if warp_matrix is None:
+            return
+        self.store.warp([t.slot for t in self.tracks], warp_matrix)
+
+    def unambiguous_matches(self, bbox_tlwh):
+        """Find detections whose association is already clear from motion.
+
+        A detection is unambiguous if it does not overlap any other detection
+        and lies inside the gate of exactly one track, that track gates no
+        other detection, and it is a confirmed track that was updated in the
+        previous frame. All tracks count as competitors, including lost and
+        tentative ones, since they take part in the matching cascade or the
+        IoU matching. For unambiguous detections the track's appearance
+        feature can be reused instead of running the ReID model. Must be
+        called after `predict`.
+
+        Parameters
+        ----------
+        bbox_tlwh : ndarray
+            An Nx4 matrix of detections in format `(top left x, top left y,
+            width, height)`.
+
+        Returns
+        -------
+        ndarray
+            An array of length N holding, for each detection, the index into
+            `tracks` of its unambiguous track, or -1.
+        """
+        bbox_tlwh = np.asarray(bbox_tlwh, dtype=float).reshape(-1, 4)
+        owners = np.full(len(bbox_tlwh), -1, dtype=int)
+        eligible = np.asarray([
+            t.is_confirmed() and t.time_since_update == 1 for t in self.tracks], dtype=bool)
+        if not eligible.any() or len(bbox_tlwh) == 0:
+            return owners
+
+        gate = self._gating_distance(bbox_tlwh) <= kalman_filter.chi2inv95[4]
+        overlap = iou_matching.iou_matrix(bbox_tlwh, bbox_tlwh) > 0
+        np.fill_diagonal(overlap, False)
+
+        track_rows = gate.argmax(axis=0)
+        unambiguous = (gate.sum(axis=0) == 1) & ~overlap.any(axis=1)
+        unambiguous &= gate.sum(axis=1)[track_rows] == 1
+        unambiguous &= eligible[track_rows]
+        owners[unambiguous] = track_rows[unambiguous]
+        return owners
+
+    def nearest_confirmed(self, bbox_tlwh):
+        """Find, for each detection, the closest confirmed track gating it.
+
+        Parameters
+        ----------
+        bbox_tlwh : ndarray
+            An Nx4 matrix of detections in format `(top left x, top left y,
+            width, height)`.
+
+        Returns
+        -------
+        ndarray
+            An array of length N holding, for each detection, the index into
+            `tracks` of the confirmed track with the smallest gating distance
+            among those whose gate contains the detection, or -1.
+        """
+        bbox_tlwh = np.asarray(bbox_tlwh, dtype=float).reshape(-1, 4)
+        nearest = np.full(len(bbox_tlwh), -1, dtype=int)
+        confirmed = np.asarray([t.is_confirmed() for t in self.tracks], dtype=bool)
+        if not confirmed.any() or len(bbox_tlwh) == 0:
+            return nearest
+        distance = self._gating_distance(bbox_tlwh)
+        distance[~confirmed] = np.inf
+        rows = distance.argmin(axis=0)
+        gated = distance[rows, np.arange(len(bbox_tlwh))] <= kalman_filter.chi2inv95[4]
+        nearest[gated] = rows[gated]
+        return nearest
+
+    def _gating_distance(self, bbox_tlwh):
+        """Squared Mahalanobis distance of every track (rows) to every
+        detection (columns)."""
+        measurements = bbox_tlwh.copy()
+        measurements[:, :2] += measurements[:, 2:] / 2
+        measurements[:, 2] /= measurements[:, 3]
+        slots = [t.slot for t in self.tracks]
+        return self.kf.multi_gating_distance(
+            self.store.mean[slots], self.store.covariance[slots], measurements)
 
     def update(self, detections, classes, confidences):
         """Perform measurement update and track management.
@@ -79,13 +197,22 @@ class Tracker:
             self._match(detections)
 
         # Update track set.
+        self.store.update(
+            [self.tracks[track_idx].slot for track_idx, _ in matches],
+            [detections[detection_idx].to_xyah() for _, detection_idx in matches],
+            np.array([detections[detection_idx].confidence for _, detection_idx in matches]))
         for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(
+            self.tracks[track_idx].update_state(
                 detections[detection_idx], classes[detection_idx], confidences[detection_idx])
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
-        for detection_idx in unmatched_detections:
-            self._initiate_track(detections[detection_idx], classes[detection_idx].item(), confidences[detection_idx].item())
+        self._initiate_tracks(
+            [detections[i] for i in unmatched_detections],
+            [classes[i].item() for i in unmatched_detections],
+            [confidences[i].item() for i in unmatched_detections])
+        deleted = [t for t in self.tracks if t.is_deleted()]
+        self.deleted_tracks = [t.track_id for t in deleted]
+        self.store.release([t.slot for t in deleted])
         self.tracks = [t for t in self.tracks if not t.is_deleted()]
 
         # Update distance metric.
@@ -111,14 +238,14 @@ class Tracker:
         is more intuitive in terms of values.
         """
         # Compute First the Position-based Cost Matrix
-        pos_cost = np.empty([len(track_indices), len(detection_indices)])
         msrs = np.asarray([dets[i].to_xyah() for i in detection_indices])
-        for row, track_idx in enumerate(track_indices):
-            pos_cost[row, :] = np.sqrt(
-                self.kf.gating_distance(
-                    tracks[track_idx].mean, tracks[track_idx].covariance, msrs, False
-                )
-            ) / self.GATING_THRESHOLD
+        pos_cost = np.sqrt(
+            self.kf.multi_gating_distance(
+                np.asarray([tracks[i].mean for i in track_indices]),
+                np.asarray([tracks[i].covariance for i in track_indices]),
+                msrs, False
+            )
+        ) / self.GATING_THRESHOLD
         pos_gate = pos_cost > 1.0
         # Now Compute the Appearance-based Cost Matrix
         app_cost = self.metric.distance(
@@ -138,7 +265,8 @@ class Tracker:
             features = np.array([dets[i].feature for i in detection_indices])
             targets = np.array([tracks[i].track_id for i in track_indices])
             cost_matrix = self.metric.distance(features, targets)
-            cost_matrix = linear_assignment.gate_cost_matrix(cost_matrix, tracks, dets, track_indices, detection_indices)
+            cost_matrix = linear_assignment.gate_cost_matrix(
+                cost_matrix, tracks, dets, track_indices, detection_indices, mc_lambda=self.mc_lambda)
 
             return cost_matrix
 
@@ -171,7 +299,16 @@ class Tracker:
         return matches, unmatched_tracks, unmatched_detections
 
     def _initiate_track(self, detection, class_id, conf):
-        self.tracks.append(Track(
-            detection.to_xyah(), self._next_id, class_id, conf, self.n_init, self.max_age, self.ema_alpha,
-            detection.feature))
-        self._next_id += 1
+        self._initiate_tracks([detection], [class_id], [conf])
+
+    def _initiate_tracks(self, detections, class_ids, confs):
+        if len(detections) == 0:
+            return
+        measurements = np.asarray([d.to_xyah() for d in detections])
+        slots = self.store.initiate(measurements)
+        for detection, measurement, class_id, conf, slot in zip(
+                detections, measurements, class_ids, confs, slots):
+            self.tracks.append(Track(
+                measurement, self._next_id, class_id, conf, self.n_init, self.max_age, self.ema_alpha,
+                detection.feature, store=self.store, slot=slot))
+            self._next_id += 1
@@ -3,16 +3,56 @@ import torch
 import sys
 import gdown
 from os.path import exists as file_exists, join
+from pathlib import Path
 
 from .sort.nn_matching import NearestNeighborDistanceMetric
 from .sort.detection import Detection
 from .sort.tracker import Tracker
+from .sort.reid_scheduler import ReIDRefreshScheduler
 from .deep.reid_model_factory import show_downloadeable_models, get_model_url, get_model_name
 
-from torchreid.utils import FeatureExtractor
+from torchreid.inference import FeatureExtractor, cache_flat_weights
 from torchreid.utils.tools import download_url
 
-__all__ = ['StrongSORT']
+__all__ = ['StrongSORT', 'build_extractor']
+
+
+def build_extractor(model_weights, device, input_sizes=None, num_threads=None, optimize=False):
+    """Builds the ReID FeatureExtractor for `model_weights`, downloading
+    them if needed. `num_threads` only applies to ONNX models, `optimize`
+    (True, 'freeze' or 'compile', see FeatureExtractor) only to PyTorch
+    checkpoints."""
+    model_name = get_model_name(model_weights)
+    model_url = get_model_url(model_weights)
+
+    if not file_exists(model_weights) and model_url is not None:
+        gdown.download(model_url, str(model_weights), quiet=False)
+    elif file_exists(model_weights):
+        pass
+    elif model_url is None:
+        print('No URL associated to the chosen DeepSort weights. Choose between:')
+        show_downloadeable_models()
+        exit()
+
+    # models exported with deep/reid_export.py run on their own runtime,
+    # models quantized with deep/reid_quantize.py on CPU int8 kernels
+    backend = {'.onnx': 'onnx', '.torchscript': 'torchscript'}.get(
+        Path(model_weights).suffix, 'pytorch')
+    if backend == 'torchscript' and Path(model_weights).stem.endswith('_int8'):
+        backend = 'int8'
+    # PyTorch checkpoints are converted once to memory-mapped flat weights,
+    # shared by every process that loads them
+    model_path = cache_flat_weights(model_weights) if backend == 'pytorch' else model_weights
+    return FeatureExtractor(
+        # get rid of dataset information DeepSort model name
+        model_name=model_name,
+        model_path=model_path,
+        device=str(device),
+        backend=backend,
+        input_sizes=input_sizes,
+        num_threads=num_threads,
+        optimize=optimize
+    )
 
 
 class StrongSORT(object):
@@ -23,39 +63,60 @@ class StrongSORT(object):
                  max_age=70, n_init=3,
                  nn_budget=100,
                  mc_lambda=0.995,
-                 ema_alpha=0.9
+                 ema_alpha=0.9,
+                 cmc_method='none',
+                 cmc_budget_ms=None,
+                 lazy_reid=False,
+                 reid_refresh_stride=None,
+                 reid_refresh_change=0.2,
+                 reid_budget=None,
+                 gallery_storage='float32',
+                 pq_subspaces=32,
+                 pq_train_size=4096,
+                 reid_input_sizes=None,
+                 reid_num_threads=None,
+                 reid_optimize=False,
+                 extractor=None
                 ):
-        model_name = get_model_name(model_weights)
-        model_url = get_model_url(model_weights)
-
-        if not file_exists(model_weights) and model_url is not None:
-            gdown.download(model_url, str(model_weights), quiet=False)
-        elif file_exists(model_weights):
-            pass
-        elif model_url is None:
-            print('No URL associated to the chosen DeepSort weights. Choose between:')
-            show_downloadeable_models()
-            exit()
-
-        self.extractor = FeatureExtractor(
-            # get rid of dataset information DeepSort model name
-            model_name=model_name,
-            model_path=model_weights,
-            device=str(device)
-        )
+        # several sources can share one extractor, e.g. a deep/reid_server.ReIDServer
+        if extractor is None:
+            extractor = build_extractor(model_weights, device, reid_input_sizes, reid_num_threads,
+                                        reid_optimize)
+        self.extractor = extractor
+
+        # lazy ReID: only run the extractor on detections whose association
+        # is ambiguous from motion alone; the others reuse their track feature
+        self.lazy_reid = lazy_reid
+        self.reid_extracted = 0
+        self.reid_skipped = 0
+        # ... and refresh those cached features every few frames / on box changes.
+        # With a budget, the scheduler also bounds ReID in full mode: detections
+        # gating a confirmed track are only extracted when due and within budget
+        self.reid_scheduler = ReIDRefreshScheduler(
+            reid_refresh_stride, reid_refresh_change, reid_budget)
 
         self.max_dist = max_dist
         metric = NearestNeighborDistanceMetric(
-            "cosine", self.max_dist, nn_budget)
+            "cosine", self.max_dist, nn_budget, storage=gallery_storage,
+            pq_subspaces=pq_subspaces, pq_train_size=pq_train_size)
         self.tracker = Tracker(
-            metric, max_iou_distance=max_iou_distance, max_age=max_age, n_init=n_init)
+            metric, max_iou_distance=max_iou_distance, max_age=max_age, n_init=n_init,
+            ema_alpha=ema_alpha, mc_lambda=mc_lambda,
+            cmc_method=cmc_method, cmc_budget_ms=cmc_budget_ms)
 
     def update(self, bbox_xywh, confidences, classes, ori_img):
         self.height, self.width = ori_img.shape[:2]
+        self.tracker.predict()
+
         # generate detections
-        features = self._get_features(bbox_xywh, ori_img)
         bbox_tlwh = self._xywh_to_tlwh(bbox_xywh)
-        detections = [Detection(bbox_tlwh[i], conf, features[i]) for i, conf in enumerate(
+        reused = np.zeros(len(bbox_xywh), dtype=bool)
+        if self.lazy_reid or self.reid_scheduler.budget is not None:
+            features, reused = self._get_scheduled_features(bbox_xywh, bbox_tlwh, ori_img)
+        else:
+            features = self._get_features(bbox_xywh, ori_img)
+            self.reid_extracted += len(bbox_xywh)
+        detections = [Detection(bbox_tlwh[i], conf, features[i], reused[i]) for i, conf in enumerate(
             confidences)]
 
         # run on non-maximum supression
@@ -63,7 +124,6 @@ class StrongSORT(object):
         scores = np.array([d.confidence for d in detections])
 
         # update tracker
-        self.tracker.predict()
         self.tracker.update(detections, classes, confidences)
 
         # output bbox identities
@@ -131,14 +191,40 @@ class StrongSORT(object):
         h = int(y2 - y1)
         return t, l, w, h
 
+    def _get_scheduled_features(self, bbox_xywh, bbox_tlwh, ori_img):
+        bbox_tlwh = np.asarray(bbox_tlwh)
+        nearest = self.tracker.nearest_confirmed(bbox_tlwh)
+        if self.lazy_reid:
+            owners = self.tracker.unambiguous_matches(bbox_tlwh)
+            references = np.where(owners >= 0, owners, nearest)
+            contested = (owners < 0) & (nearest >= 0)
+        else:
+            references, contested = nearest, None
+        gated = np.flatnonzero(references >= 0)
+        refresh = self.reid_scheduler.select(
+            [self.tracker.tracks[k] for k in references[gated]], bbox_tlwh[gated],
+            None if contested is None else contested[gated])
+        reused = np.zeros(len(references), dtype=bool)
+        reused[gated[~refresh]] = True
+        extract = np.flatnonzero(~reused)
+        self.reid_skipped += reused.sum()
+        self.reid_extracted += len(extract)
+        if not reused.any():
+            return self._get_features(bbox_xywh, ori_img), reused
+
+        reused_features = torch.from_numpy(np.stack(
+            [self.tracker.tracks[k].features[-1] for k in references[reused]]))
+        features = reused_features.new_empty((len(references), reused_features.size(1)))
+        features[torch.from_numpy(reused)] = reused_features
+        if len(extract):
+            features[torch.from_numpy(extract)] = self._get_features(
+                bbox_xywh[torch.from_numpy(extract)], ori_img).cpu()
+        return features, reused
+
     def _get_features(self, bbox_xywh, ori_img):
-        im_crops = []
-        for box in bbox_xywh:
-            x1, y1, x2, y2 = self._xywh_to_xyxy(box)
-            im = ori_img[y1:y2, x1:x2]
-            im_crops.append(im)
-        if im_crops:
-            features = self.extractor(im_crops)
+        boxes = [self._xywh_to_xyxy(box) for box in bbox_xywh]
+        if boxes:
+            features = self.extractor.extract_boxes(ori_img, np.asarray(boxes))
         else:
             features = np.array([])
         return features
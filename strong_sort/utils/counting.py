@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+
+
+class TrackClassCounter(object):
+    """
+    Online count of tracked objects per class.
+
+    Every track is counted once, under the class it was most often detected
+    as (ties go to the smallest class id). This is what `--count` used to
+    recompute every frame by re-reading the whole MOT text file with pandas.
+    Here, each observation updates the class histogram of its track and, if
+    the track's majority class changes, moves the track from one class count
+    to the other, so the cost per observation is constant.
+
+    Examples:
+        counter = TrackClassCounter()
+        counter.update(outputs)  # StrongSORT outputs of one frame
+        counter.counts(names)    # {'car': 3, 'person': 12}
+        counter.save('counts.json')
+    """
+
+    def __init__(self):
+        self.histograms = {}  # track id -> {class id: observations}
+        self.majority = {}  # track id -> class id
+        self.class_counts = {}  # class id -> number of tracks
+
+    def observe(self, track_id, class_id):
+        """Adds one observation of track `track_id` as class `class_id`."""
+        histogram = self.histograms.setdefault(track_id, {})
+        histogram[class_id] = histogram.get(class_id, 0) + 1
+        current = self.majority.get(track_id)
+        if current == class_id:
+            return
+        if current is not None:
+            # only the count of `class_id` went up, so it is the only
+            # class that can take over the majority
+            n, m = histogram[class_id], histogram[current]
+            if n < m or (n == m and class_id > current):
+                return
+            self.class_counts[current] -= 1
+            if not self.class_counts[current]:
+                del self.class_counts[current]
+        self.majority[track_id] = class_id
+        self.class_counts[class_id] = self.class_counts.get(class_id, 0) + 1
+
+    def update(self, outputs):
+        """Adds the StrongSORT outputs of one frame, rows of
+        (x1, y1, x2, y2, id, class, conf)."""
+        for output in outputs:
+            self.observe(int(output[4]), int(output[5]))
+
+    def counts(self, names=None):
+        """Returns {class: number of tracks}, sorted by class. With `names`
+        (class id -> name) the keys are class names."""
+        if names is None:
+            return dict(sorted(self.class_counts.items()))
+        return dict(sorted((names[c], n) for c, n in self.class_counts.items()))
+
+    def state_dict(self):
+        return {
+            'histograms': {str(i): {str(c): n for c, n in h.items()}
+                           for i, h in self.histograms.items()},
+            'counts': {str(c): n for c, n in self.class_counts.items()},
+        }
+
+    def load_state_dict(self, state):
+        self.__init__()
+        for track_id, histogram in state['histograms'].items():
+            for class_id, n in histogram.items():
+                track_id, class_id = int(track_id), int(class_id)
+                self.histograms.setdefault(track_id, {})[class_id] = n
+        for track_id, histogram in self.histograms.items():
+            # majority class, ties going to the smallest class id
+            class_id = min(histogram, key=lambda c: (-histogram[c], c))
+            self.majority[track_id] = class_id
+            self.class_counts[class_id] = self.class_counts.get(class_id, 0) + 1
+
+    def save(self, path):
+        """Writes a snapshot of the counter to the JSON file `path`."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.state_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        counter = cls()
+        with open(path) as f:
+            counter.load_state_dict(json.load(f))
+        return counter
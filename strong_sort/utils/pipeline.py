@@ -0,0 +1,177 @@
+import queue
+import threading
+import time
+
+
+class _EndOfStream(object):
+    pass
+
+
+_END = _EndOfStream()
+
+
+class StageStats(object):
+    """
+    Per-stage counters: processed items, time spent in the stage function
+    and the depth of the stage's input queue.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_time = 0.
+        self.max_time = 0.
+        self.max_queue_depth = 0
+        self.queue = None
+
+    def update(self, elapsed):
+        self.count += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if self.queue is not None:
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': 1E3 * self.total_time / max(self.count, 1),
+            'max_ms': 1E3 * self.max_time,
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'max_queue_depth': self.max_queue_depth,
+        }
+
+
+class Pipeline(object):
+    """
+    Runs a source iterator through a chain of stages, each stage on its own
+    thread, connected by bounded queues.
+
+    Every stage is a function mapping one item to the next. Stages handle one
+    item at a time, in order, so the output order matches the source order.
+    A full queue blocks the stage feeding it (backpressure), which bounds the
+    number of in-flight items to about `queue_size` per stage. Throughput is
+    then limited by the slowest stage instead of the sum of all stages.
+
+    With `queue_size=0` nothing runs in the background: each item goes
+    through all stages in the caller's thread, as a plain loop would.
+
+    Args:
+        source: iterable producing the items.
+        stages: list of (name, function) pairs.
+        queue_size (int): capacity of each inter-stage queue.
+
+    Examples:
+        pipeline = Pipeline(dataset, [('detect', detect), ('track', track)], queue_size=2)
+        for item in pipeline:
+            render(item)
+        print(pipeline.stats())
+    """
+
+    def __init__(self, source, stages, queue_size=2):
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stats = [StageStats('read')] + [StageStats(name) for name, _ in stages]
+        self._stop = threading.Event()
+        self._threads = []
+
+    def stats(self):
+        """Returns {stage name: stats dict}."""
+        return {s.name: s.as_dict() for s in self._stats}
+
+    def __iter__(self):
+        if self.queue_size <= 0:
+            return self._run_inline()
+        return self._run_threaded()
+
+    def _run_inline(self):
+        source = iter(self.source)
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(source)
+            except StopIteration:
+                return
+            self._stats[0].update(time.perf_counter() - t)
+            for (_, fn), stats in zip(self.stages, self._stats[1:]):
+                t = time.perf_counter()
+                item = fn(item)
+                stats.update(time.perf_counter() - t)
+            yield item
+
+    def _put(self, q, item):
+        # blocks while the queue is full, but gives up once the pipeline stops
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _read(self, out, stats):
+        try:
+            source = iter(self.source)
+            while not self._stop.is_set():
+                t = time.perf_counter()
+                try:
+                    item = next(source)
+                except StopIteration:
+                    break
+                stats.update(time.perf_counter() - t)
+                if not self._put(out, item):
+                    return
+        except BaseException as e:
+            self._put(out, e)
+            return
+        self._put(out, _END)
+
+    def _work(self, fn, inp, out, stats):
+        while True:
+            item = self._get(inp)
+            if item is _END or isinstance(item, BaseException):
+                self._put(out, item)
+                return
+            t = time.perf_counter()
+            try:
+                item = fn(item)
+            except BaseException as e:
+                item = e
+            stats.update(time.perf_counter() - t)
+            if not self._put(out, item):
+                return
+
+    def _run_threaded(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._threads = [threading.Thread(
+            target=self._read, args=(queues[0], self._stats[0]), daemon=True)]
+        for i, ((_, fn), stats) in enumerate(zip(self.stages, self._stats[1:])):
+            stats.queue = queues[i]
+            self._threads.append(threading.Thread(
+                target=self._work, args=(fn, queues[i], queues[i + 1], stats), daemon=True))
+        for thread in self._threads:
+            thread.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """Stops all stage threads, e.g. when the consumer quits early."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=1.)
@@ -0,0 +1,190 @@
+import multiprocessing as mp
+import queue
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+
+
+def _attach(name, shape, dtype, handles):
+    """Returns an ndarray view of the shared memory block `name`, attaching
+    to it on first use."""
+    if name not in handles:
+        handles[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=handles[name].buf)
+
+
+def _worker(tracker_factory, sources, ecc, requests, results):
+    # errors are sent back as traceback strings: an exception that cannot be
+    # pickled would be dropped by the queue and leave the caller waiting
+    handles = {}
+    frame_names = {}  # source -> name of its current frame block
+    prev_frames = {}
+    im0 = dets = None
+    try:
+        trackers = {i: tracker_factory() for i in sources}
+        error = None
+    except Exception:
+        trackers, error = {}, traceback.format_exc()
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        i, frame_name, frame_shape, dets_name, n = request
+        if error is not None:
+            results.put((i, None, [], error))
+            continue
+        try:
+            im0 = dets = None
+            if frame_names.get(i, frame_name) != frame_name:
+                # the caller replaced the block of this source with a larger
+                # one and unlinked the old one; drop our mapping of it
+                handles.pop(frame_names[i]).close()
+            frame_names[i] = frame_name
+            im0 = _attach(frame_name, frame_shape, np.uint8, handles)
+            if ecc:
+                # the block is overwritten by the next frame, and the
+                # motion compensator keeps the previous one around
+                im0 = im0.copy()
+                trackers[i].tracker.camera_update(prev_frames.get(i), im0)
+                prev_frames[i] = im0
+            if n:
+                dets = torch.from_numpy(_attach(dets_name, (n, 6), np.float32, handles).copy())
+                outputs = trackers[i].update(dets[:, 0:4], dets[:, 4], dets[:, 5], im0)
+            else:
+                trackers[i].increment_ages()
+                outputs = []
+            results.put((i, outputs, trackers[i].tracker.deleted_tracks, None))
+        except Exception:
+            results.put((i, None, [], traceback.format_exc()))
+    im0 = dets = None  # release the views before closing their blocks
+    prev_frames.clear()
+    for handle in handles.values():
+        handle.close()
+
+
+class ShardedTracker(object):
+    """Runs the StrongSORT instances of several sources in worker processes.
+
+    Source `i` is owned by worker `i % workers`, so every tracker lives in a
+    single process and sees its frames in order. Frames and detections are
+    handed over through one shared memory block per source instead of being
+    pickled; only the block names and sizes go through the request queues.
+    The detector stays in the calling process, where it already runs one
+    forward pass over the frames of all sources.
+
+    If a tracker fails, `update` still collects the results of the other
+    sources for that frame, so no stale result is left in the queue, and
+    then raises a RuntimeError with the worker's traceback. If a worker
+    dies, the sharded tracker is marked broken and every later `update`
+    raises.
+
+    Workers are started with the 'spawn' method, so `tracker_factory` has to
+    be picklable (e.g. a `functools.partial` of StrongSORT) and the calling
+    script needs an `if __name__ == "__main__"` guard.
+
+    Args:
+        tracker_factory (callable): builds one StrongSORT, called in the
+            worker for each source it owns.
+        num_sources (int): number of sources.
+        workers (int): number of worker processes, at most `num_sources`.
+        max_det (int): maximum detections per frame.
+        ecc (bool): run camera motion compensation before each update.
+
+    After each `update`, `deleted_tracks[i]` holds the IDs of the tracks of
+    source `i` deleted in that frame (see `Tracker.deleted_tracks`).
+
+    Examples:
+        trackers = ShardedTracker(partial(StrongSORT, weights, device), 16, workers=8)
+        outputs = trackers.update(frames, dets)  # dets[i]: (N, 6) xywh, conf, class
+        trackers.close()
+    """
+
+    def __init__(self, tracker_factory, num_sources, workers=2, max_det=1000, ecc=False):
+        ctx = mp.get_context('spawn')
+        self.num_sources = num_sources
+        self.workers = max(1, min(workers, num_sources))
+        self._frames = [None] * num_sources
+        self.deleted_tracks = [[] for _ in range(num_sources)]
+        self._dets = [shared_memory.SharedMemory(create=True, size=max_det * 6 * 4)
+                      for _ in range(num_sources)]
+        self.max_det = max_det
+        self._results = ctx.Queue()
+        self._broken = None  # why the workers can no longer be trusted
+        self._requests = []
+        self._processes = []
+        for w in range(self.workers):
+            requests = ctx.Queue()
+            process = ctx.Process(
+                target=_worker,
+                args=(tracker_factory, list(range(w, num_sources, self.workers)), ecc,
+                      requests, self._results),
+                daemon=True)
+            process.start()
+            self._requests.append(requests)
+            self._processes.append(process)
+
+    def _frame_block(self, i, im0):
+        block = self._frames[i]
+        if block is None or block.size < im0.nbytes:
+            if block is not None:
+                block.close()
+                block.unlink()
+            block = self._frames[i] = shared_memory.SharedMemory(create=True, size=im0.nbytes)
+        return block
+
+    def update(self, frames, dets):
+        """Updates the tracker of every source with its frame.
+
+        Args:
+            frames (list): one (H, W, C) uint8 image per source.
+            dets (list): one (N, 6) array per source with boxes as
+                (x center, y center, w, h), confidences and classes, or None
+                when there are no detections.
+
+        Returns:
+            list: the StrongSORT outputs of every source.
+        """
+        if self._broken is not None:
+            raise RuntimeError('ShardedTracker is broken: {}'.format(self._broken))
+        for i, (im0, det) in enumerate(zip(frames, dets)):
+            block = self._frame_block(i, im0)
+            np.copyto(np.ndarray(im0.shape, dtype=np.uint8, buffer=block.buf), im0)
+            n = 0 if det is None else min(len(det), self.max_det)
+            if n:
+                np.copyto(np.ndarray((n, 6), dtype=np.float32, buffer=self._dets[i].buf),
+                          np.asarray(det[:n], dtype=np.float32))
+            self._requests[i % self.workers].put((i, block.name, im0.shape, self._dets[i].name, n))
+
+        outputs = [None] * len(frames)
+        errors = []
+        for _ in range(len(frames)):
+            i, result, deleted, error = self._get()
+            if error is not None:
+                errors.append('source {}:\n{}'.format(i, error))
+            outputs[i] = result
+            self.deleted_tracks[i] = deleted
+        if errors:
+            raise RuntimeError('Tracker update failed for ' + '\n'.join(errors))
+        return outputs
+
+    def _get(self):
+        while True:
+            try:
+                return self._results.get(timeout=1.)
+            except queue.Empty:
+                dead = [p.pid for p in self._processes if not p.is_alive()]
+                if dead:
+                    self._broken = 'worker processes {} exited'.format(dead)
+                    raise RuntimeError('Tracker ' + self._broken)
+
+    def close(self):
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout=5.)
+        for block in self._frames + self._dets:
+            if block is not None:
+                block.close()
+                block.unlink()
@@ -0,0 +1,202 @@
+from pathlib import Path
+
+import numpy as np
+
+TRACK_FORMATS = ('txt', 'npz', 'parquet')
+COLUMNS = ('frame', 'class', 'id', 'x1', 'y1', 'x2', 'y2', 'conf')
+DTYPES = {'frame': np.int32, 'class': np.int32, 'id': np.int32, 'x1': np.float32,
+          'y1': np.float32, 'x2': np.float32, 'y2': np.float32, 'conf': np.float32}
+
+
+def _with_suffix(path, suffix):
+    # source names may contain dots, so append instead of Path.with_suffix
+    return path.parent / (path.name + suffix)
+
+
+class _TextSink(object):
+    """MOT text lines, as written by track_v5 so far, through one buffered
+    handle."""
+
+    line = '%g ' * 11 + '\n'
+
+    def __init__(self, path, buffer_size):
+        self.file = open(path, 'a', buffering=buffer_size)
+
+    def write(self, frame, outputs):
+        self.file.write(''.join(self.line % (
+            frame, cls, id, x1, y1, x2 - x1, y2 - y1, -1, -1, -1, -1)
+            for x1, y1, x2, y2, id, cls in outputs[:, :6].tolist()))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class _ChunkSink(object):
+    """Collects the columns in memory and writes them out in chunks of
+    `chunk_size` rows: one `<name>.<k>.npz` file or one Parquet row group per
+    chunk."""
+
+    def __init__(self, path, fmt, chunk_size):
+        self.path = Path(path)
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.chunks = 0
+        self.rows = 0
+        self.columns = {c: [] for c in COLUMNS}
+        self.parquet = None
+
+    def write(self, frame, outputs):
+        self.columns['frame'].append(np.full(len(outputs), frame, dtype=DTYPES['frame']))
+        self.columns['x1'].append(outputs[:, 0])
+        self.columns['y1'].append(outputs[:, 1])
+        self.columns['x2'].append(outputs[:, 2])
+        self.columns['y2'].append(outputs[:, 3])
+        self.columns['id'].append(outputs[:, 4])
+        self.columns['class'].append(outputs[:, 5])
+        self.columns['conf'].append(outputs[:, 6])
+        self.rows += len(outputs)
+        if self.rows >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        chunk = {c: np.concatenate(v).astype(DTYPES[c]) for c, v in self.columns.items()}
+        if self.fmt == 'npz':
+            np.savez(_with_suffix(self.path, '.{:05d}.npz'.format(self.chunks)), **chunk)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.table(chunk)
+            if self.parquet is None:
+                self.parquet = pq.ParquetWriter(str(_with_suffix(self.path, '.parquet')), table.schema)
+            self.parquet.write_table(table)
+        self.chunks += 1
+        self.rows = 0
+        self.columns = {c: [] for c in COLUMNS}
+
+    def close(self):
+        self.flush()
+        if self.parquet is not None:
+            self.parquet.close()
+
+
+class TrackWriter(object):
+    """
+    Writes the StrongSORT outputs of every source to `save_dir`.
+
+    Each source (a video, an image folder or a stream) gets one sink that
+    stays open for the whole run:
+
+    * ``txt``: the MOT text file `<name>.txt` written through a buffered
+      handle that is flushed every `flush_every` frames.
+    * ``npz``: columns (see `COLUMNS`) saved as `<name>.<k>.npz` chunks of
+      `chunk_size` rows.
+    * ``parquet``: the same columns in `<name>.parquet`, one row group per
+      chunk (needs pyarrow).
+
+    `read_tracks` loads any of them back into NumPy arrays.
+
+    Args:
+        save_dir (str or Path): output directory.
+        fmt (str): one of `TRACK_FORMATS`.
+        flush_every (int): frames between flushes of a text sink.
+        chunk_size (int): rows per npz chunk / Parquet row group.
+        buffer_size (int): buffer size of a text sink in bytes.
+
+    Examples:
+        writer = TrackWriter(save_dir / 'tracks', fmt='npz')
+        writer.write('video', frame_idx + 1, outputs)  # every frame, [] when nothing is tracked
+        writer.close()
+        tracks = read_tracks(save_dir / 'tracks' / 'video', fmt='npz')
+    """
+
+    def __init__(self, save_dir, fmt='txt', flush_every=100, chunk_size=10000,
+                 buffer_size=1 << 20):
+        if fmt not in TRACK_FORMATS:
+            raise ValueError('Invalid track format {}; must be one of {}'.format(fmt, TRACK_FORMATS))
+        self.save_dir = Path(save_dir)
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.sinks = {}
+        self._frames = {}
+
+    def write(self, name, frame, outputs):
+        """Adds the outputs of one frame. Call it for every frame of a
+        source, with empty outputs when nothing is tracked: text sinks are
+        flushed by frame count.
+
+        Args:
+            name (str): source name, the file name without suffix.
+            frame (int): frame number.
+            outputs (numpy.ndarray): StrongSORT outputs with shape (N, 7):
+                x1, y1, x2, y2, id, class, conf.
+        """
+        sink = self.sinks.get(name)
+        if sink is None:
+            path = self.save_dir / name
+            if self.fmt == 'txt':
+                sink = _TextSink(_with_suffix(path, '.txt'), self.buffer_size)
+            else:
+                sink = _ChunkSink(path, self.fmt, self.chunk_size)
+            self.sinks[name] = sink
+            self._frames[name] = 0
+        if len(outputs):
+            sink.write(frame, np.asarray(outputs))
+        self._frames[name] += 1
+        if self.fmt == 'txt' and self._frames[name] % self.flush_every == 0:
+            sink.flush()
+
+    def flush(self):
+        for sink in self.sinks.values():
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks.values():
+            sink.close()
+        self.sinks = {}
+
+
+def read_tracks(path, fmt='txt'):
+    """Loads tracks written by TrackWriter.
+
+    Args:
+        path (str or Path): output path of one source, without suffix.
+        fmt (str): one of `TRACK_FORMATS`.
+
+    Returns:
+        dict: column name -> numpy.ndarray, see `COLUMNS`. Text files have
+            no confidences, their `conf` column is NaN.
+    """
+    path = Path(path)
+    if fmt == 'txt':
+        rows = np.loadtxt(_with_suffix(path, '.txt'), ndmin=2).reshape(-1, 11)
+        tracks = {'frame': rows[:, 0], 'class': rows[:, 1], 'id': rows[:, 2],
+                  'x1': rows[:, 3], 'y1': rows[:, 4],
+                  'x2': rows[:, 3] + rows[:, 5], 'y2': rows[:, 4] + rows[:, 6],
+                  'conf': np.full(len(rows), np.nan)}
+    elif fmt == 'npz':
+        chunks = sorted(path.parent.glob(path.name + '.*.npz'))
+        if not chunks:
+            raise FileNotFoundError('No track chunks found for {}'.format(path))
+        tracks = {c: [] for c in COLUMNS}
+        for chunk in chunks:
+            with np.load(chunk) as data:
+                for c in COLUMNS:
+                    tracks[c].append(data[c])
+        tracks = {c: np.concatenate(v) for c, v in tracks.items()}
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(str(_with_suffix(path, '.parquet')))
+        tracks = {c: table.column(c).to_numpy() for c in COLUMNS}
+    else:
+        raise ValueError('Invalid track format {}; must be one of {}'.format(fmt, TRACK_FORMATS))
+    return {c: tracks[c].astype(DTYPES[c]) for c in COLUMNS}
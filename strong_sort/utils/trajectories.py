@@ -0,0 +1,98 @@
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+
+class TrajectoryStore(object):
+    """
+    Recent box centers of every track, for drawing trajectories.
+
+    Each track keeps its last `maxlen` centers in a ring buffer. Tracks that
+    StrongSORT deletes are dropped by passing their IDs to `evict` (see
+    `Tracker.deleted_tracks`), so memory is bounded by the number of live
+    tracks. As a fallback for callers that do not, tracks that have not been
+    seen for more than `max_age` frames are evicted too; tracks are kept
+    ordered by the frame they were last seen in, which makes that a pop from
+    the front.
+
+    `draw` renders the trajectories of the tracks seen in the current frame
+    with a single `cv2.polylines` call. With `persistent=True` every new
+    segment is instead added once to an overlay layer that is blended into
+    each frame, so the full paths, including those of deleted tracks, stay
+    visible at a cost that does not grow with the length of the session.
+
+    Args:
+        maxlen (int): number of centers kept per track.
+        max_age (int): frames after which an unseen track is evicted.
+        color (tuple): BGR line color.
+        thickness (int): line thickness in pixels.
+        persistent (bool): draw on a persistent overlay layer.
+
+    Examples:
+        trajectories = TrajectoryStore(maxlen=64, max_age=cfg.STRONGSORT.MAX_AGE)
+        trajectories.update(outputs)  # every frame, [] when nothing is tracked
+        trajectories.evict(strongsort.tracker.deleted_tracks)
+        trajectories.draw(im0)
+    """
+
+    def __init__(self, maxlen=64, max_age=70, color=(0, 0, 255), thickness=2, persistent=False):
+        self.maxlen = maxlen
+        self.max_age = max_age
+        self.color = color
+        self.thickness = thickness
+        self.persistent = persistent
+        self.frame = 0
+        self.tracks = OrderedDict()  # track id -> (last seen frame, deque of centers)
+        self._current = []
+        self._segments = []
+        self._layer = None
+        self._mask = None
+
+    def update(self, outputs):
+        """Adds the box centers of one frame's StrongSORT outputs, rows of
+        (x1, y1, x2, y2, id, class, conf), and evicts tracks unseen for more
+        than `max_age` frames."""
+        self.frame += 1
+        self._current = []
+        self._segments = []
+        for output in outputs:
+            track_id = int(output[4])
+            center = ((int(output[0]) + int(output[2])) // 2, (int(output[1]) + int(output[3])) // 2)
+            if track_id in self.tracks:
+                _, points = self.tracks.pop(track_id)
+                self._segments.append((points[-1], center))
+            else:
+                points = deque(maxlen=self.maxlen)
+            points.append(center)
+            self.tracks[track_id] = (self.frame, points)
+            self._current.append(points)
+        while self.tracks:
+            track_id, (last_seen, _) = next(iter(self.tracks.items()))
+            if self.frame - last_seen <= self.max_age:
+                break
+            del self.tracks[track_id]
+
+    def evict(self, track_ids):
+        """Drops the given tracks right away, e.g. the ones StrongSORT
+        deleted in this frame."""
+        for track_id in track_ids:
+            self.tracks.pop(track_id, None)
+
+    def draw(self, image):
+        """Draws the trajectories on `image` in place."""
+        if not self.persistent:
+            lines = [np.array(points, dtype=np.int32) for points in self._current if len(points) > 1]
+            if lines:
+                cv2.polylines(image, lines, False, self.color, self.thickness)
+            return image
+
+        if self._layer is None or self._layer.shape != image.shape:
+            self._layer = np.zeros_like(image)
+            self._mask = np.zeros(image.shape[:2], dtype=np.uint8)
+        if self._segments:
+            segments = [np.array(segment, dtype=np.int32) for segment in self._segments]
+            cv2.polylines(self._layer, segments, False, self.color, self.thickness)
+            cv2.polylines(self._mask, segments, False, 255, self.thickness)
+        cv2.copyTo(self._layer, self._mask, image)
+        return image
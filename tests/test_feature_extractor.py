@@ -0,0 +1,150 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT / 'strong_sort' / 'deep' / 'reid') not in sys.path:
+    sys.path.append(str(ROOT / 'strong_sort' / 'deep' / 'reid'))
+
+from torchreid.utils.feature_extractor import FeatureExtractor  # noqa: E402
+
+
+class _Pool(torch.nn.Module):
+    def forward(self, x):
+        return x.mean(dim=(2, 3))
+
+
+class _SizeBiasedPool(torch.nn.Module):
+    # embeds the same box at different input sizes to different points
+    def forward(self, x):
+        bias = torch.tensor([1., -1., 0.]) * x.size(2) / 64
+        return x.mean(dim=(2, 3)) + bias
+
+
+@pytest.fixture
+def extractors(tmp_path):
+    model_path = tmp_path / 'pool.torchscript'
+    torch.jit.script(_Pool()).save(str(model_path))
+    kwargs = dict(model_path=model_path, device='cpu', backend='torchscript')
+    return (FeatureExtractor(preprocessing='pil', **kwargs),
+            FeatureExtractor(preprocessing='cv2', **kwargs))
+
+
+def _pil_batch(extractor, images):
+    return torch.stack([extractor.preprocess(extractor.to_pil(image).convert('RGB'))
+                        for image in images])
+
+
+def _images(rng, gray=False):
+    # smooth images, so that the difference between the PIL and OpenCV
+    # resampling kernels stays small
+    images = []
+    for h, w in [(400, 180), (256, 128), (120, 50), (37, 20)]:
+        image = rng.randint(0, 256, (h // 8 + 2, w // 8 + 2, 1 if gray else 3)).astype(np.uint8)
+        image = cv2.resize(image, (w, h), interpolation=cv2.INTER_CUBIC)
+        images.append(image.reshape(h, w, -1)[..., 0] if gray else image)
+    return images
+
+
+@pytest.mark.parametrize('gray', [False, True])
+def test_cv2_preprocessing_matches_pil(extractors, gray):
+    pil, cv = extractors
+    images = _images(np.random.RandomState(0), gray)
+    expected = _pil_batch(pil, images)
+    actual = cv._preprocess_cv2(images)
+    assert actual.shape == expected.shape == (len(images), 3, 256, 128)
+    assert (actual - expected).abs().mean() < 0.02
+    assert torch.allclose(actual, expected, atol=0.2)
+
+
+def test_cv2_preprocessing_reads_paths_as_rgb(extractors, tmp_path):
+    pil, cv = extractors
+    image = _images(np.random.RandomState(1))[1]
+    path = str(tmp_path / 'image.png')
+    cv2.imwrite(path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    assert torch.allclose(cv._preprocess_cv2([path]), _pil_batch(pil, [image]), atol=1e-5)
+
+
+def test_int_sizes_are_square(tmp_path):
+    model_path = tmp_path / 'pool.torchscript'
+    torch.jit.script(_Pool()).save(str(model_path))
+    extractor = FeatureExtractor(model_path=model_path, image_size=64, input_sizes=[(128, 64), 32],
+                                 device='cpu', backend='torchscript')
+    assert extractor.image_size == (64, 64)
+    assert extractor.input_sizes == [(32, 32), (128, 64)]
+    image = np.zeros((100, 50, 3), dtype=np.uint8)
+    assert extractor.preprocess(extractor.to_pil(image)).shape == (3, 64, 64)
+
+
+def test_cv2_preprocessing_reuses_buffers(extractors):
+    _, cv = extractors
+    images = _images(np.random.RandomState(2))
+    expected = cv._preprocess_cv2(images).clone()
+    small = cv._preprocess_cv2(images[:2])
+    assert small.data_ptr() == cv._preprocess_cv2(images).data_ptr()
+    assert torch.equal(cv._preprocess_cv2(images[1:3]), expected[1:3])
+    # grows when a batch does not fit
+    assert torch.equal(cv._preprocess_cv2(images + images), torch.cat([expected, expected]))
+    cv.close()
+
+
+def test_cv2_preprocessing_buffers_are_per_thread(extractors):
+    _, cv = extractors
+    images = _images(np.random.RandomState(5))
+    expected = [cv._preprocess_cv2(images[i:i + 1]).clone() for i in range(len(images))]
+
+    def _check(i):
+        return all(torch.equal(cv._preprocess_cv2(images[i:i + 1]), expected[i]) for _ in range(20))
+
+    with ThreadPoolExecutor(max_workers=len(images)) as pool:
+        assert all(pool.map(_check, range(len(images))))
+    cv.close()
+
+
+def test_box_crops_match_whole_frame(extractors):
+    pil, _ = extractors
+    image = np.random.RandomState(3).randint(0, 256, (120, 160, 3)).astype(np.uint8)
+    boxes = np.array([[10.3, 20.7, 40.2, 90.1], [-5, 30, 25.5, 130], [60, 5, 70.8, 35]], np.float32)
+    whole = pil._crop(pil._image_tensor(image), torch.from_numpy(boxes), pil.image_size)
+    assert torch.allclose(pil.preprocess_boxes(image, boxes), whole, atol=1e-4)
+    assert torch.allclose(pil.preprocess_boxes(image, boxes[2:]), whole[2:], atol=1e-4)
+    crops = [image[20:91, 10:41], image[30:120, 0:26], image[5:35, 60:71]]
+    assert torch.equal(pil.extract_boxes(image, boxes), pil(crops))
+
+
+def _identities_frame(rng, n):
+    # one short and one tall box of each of n uniformly colored identities
+    frame = np.zeros((320, 70 * n, 3), dtype=np.uint8)
+    short, tall = [], []
+    for k, color in enumerate(rng.randint(0, 256, (n, 3))):
+        frame[10:70, 70 * k:70 * k + 30] = color
+        frame[100:300, 70 * k:70 * k + 60] = color
+        # a pixel inside the patches, so bilinear sampling stays inside them
+        short.append([70 * k + 1, 11, 70 * k + 29, 69])
+        tall.append([70 * k + 1, 101, 70 * k + 59, 299])
+    return frame, np.array(short + tall, dtype=np.float32)
+
+
+@pytest.mark.parametrize('calibration_samples', [8, 9])
+def test_bucket_distances_are_comparable(tmp_path, calibration_samples):
+    model_path = tmp_path / 'biased.torchscript'
+    torch.jit.script(_SizeBiasedPool()).save(str(model_path))
+    extractor = FeatureExtractor(model_path=model_path, input_sizes=[(128, 64), (256, 128)],
+                                 calibration_samples=calibration_samples,
+                                 device='cpu', backend='torchscript')
+    frame, boxes = _identities_frame(np.random.RandomState(4), 8)
+    assert extractor._bucketize(torch.from_numpy(boxes)).tolist() == [0] * 8 + [1] * 8
+    features = extractor.extract_boxes(frame, boxes)
+    distances = 1 - features[:8] @ features[8:].T
+    if calibration_samples > 8:  # boxes per bucket
+        # only L2-normalized: the size bias separates the same identity
+        assert distances.diagonal().max() > 0.05
+    else:
+        # the same identity is at distance 0 across buckets, closer than any other
+        assert distances.diagonal().abs().max() < 1e-3
+        assert torch.equal(distances.argmin(dim=1), torch.arange(8))
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from strong_sort.sort import iou_matching, linear_assignment  # noqa: E402
+from strong_sort.sort.iou_matching import iou, iou_matrix, overlapping_pairs  # noqa: E402
+
+
+def _boxes(rng, n, width=1920, height=1080):
+    # tlwh boxes on an integer grid, so that some boxes touch or coincide
+    h = rng.randint(20, 300, n)
+    w = (h * rng.uniform(0.3, 0.6, n)).round()
+    return np.c_[rng.randint(0, width, n), rng.randint(0, height, n), w, h].astype(float)
+
+
+class _Track(object):
+    def __init__(self, tlwh, time_since_update):
+        self.tlwh, self.time_since_update = tlwh, time_since_update
+
+    def to_tlwh(self):
+        return self.tlwh
+
+
+class _Detection(object):
+    def __init__(self, tlwh):
+        self.tlwh = tlwh
+
+
+def _iou_loop(bboxes, candidates):
+    # one `iou` call per box, as `iou_cost` did before `iou_matrix`
+    return np.array([iou(bbox, candidates) for bbox in bboxes]).reshape(len(bboxes), len(candidates))
+
+
+@pytest.mark.parametrize('n,m', [(1, 1), (1, 20), (20, 1), (50, 60), (300, 300)])
+def test_iou_matrix_matches_iou(n, m):
+    rng = np.random.RandomState(n + m)
+    bboxes, candidates = _boxes(rng, n), _boxes(rng, m)
+    candidates[:n // 2] = bboxes[:min(n // 2, m)]  # identical boxes
+    np.testing.assert_allclose(iou_matrix(bboxes, candidates), _iou_loop(bboxes, candidates))
+
+
+@pytest.mark.parametrize('n,m', [(0, 5), (5, 0), (1, 1), (20, 1), (50, 60), (300, 300)])
+def test_overlapping_pairs_matches_iou(n, m):
+    rng = np.random.RandomState(n * m)
+    bboxes, candidates = _boxes(rng, n), _boxes(rng, m)
+    expected = _iou_loop(bboxes, candidates)
+    rows, cols, ious = overlapping_pairs(bboxes, candidates)
+    actual = np.zeros((n, m))
+    actual[rows, cols] = ious
+    assert len(set(zip(rows.tolist(), cols.tolist()))) == len(rows)  # no pair twice
+    assert np.all(ious > 0)
+    np.testing.assert_array_equal(actual > 0, expected > 0)
+    np.testing.assert_allclose(actual, expected)
+
+
+@pytest.mark.parametrize('max_pairs', [iou_matching.DENSE_IOU_MAX_PAIRS, 0])
+def test_iou_cost_matches_iou(monkeypatch, max_pairs):
+    monkeypatch.setattr(iou_matching, 'DENSE_IOU_MAX_PAIRS', max_pairs)
+    rng = np.random.RandomState(0)
+    tracks = [_Track(box, rng.randint(0, 3)) for box in _boxes(rng, 40)]
+    detections = [_Detection(box) for box in _boxes(rng, 50)]
+    track_indices, detection_indices = np.arange(0, 40, 2), np.arange(5, 50)
+    expected = 1. - _iou_loop(np.array([tracks[i].tlwh for i in track_indices]),
+                              np.array([detections[i].tlwh for i in detection_indices]))
+    expected[[tracks[i].time_since_update > 1 for i in track_indices]] = linear_assignment.INFTY_COST
+    np.testing.assert_allclose(
+        iou_matching.iou_cost(tracks, detections, track_indices, detection_indices), expected)
@@ -0,0 +1,111 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from strong_sort.sort.kalman_filter import KalmanFilter  # noqa: E402
+from strong_sort.sort.track_store import TrackStore  # noqa: E402
+
+
+def _measurements(rng, n):
+    # (x, y, a, h) boxes of people in a 1920x1080 frame
+    return np.c_[rng.uniform(0, 1920, n), rng.uniform(0, 1080, n),
+                 rng.uniform(0.3, 0.6, n), rng.uniform(40, 400, n)]
+
+
+def _states(kf, rng, n, steps=3):
+    # states with non-trivial covariances, run through the per-track filter
+    states = [kf.initiate(m) for m in _measurements(rng, n)]
+    for _ in range(steps):
+        states = [kf.predict(*state) for state in states]
+        measurements = [kf.project(*state)[0] + rng.normal(0, 2, 4) for state in states]
+        states = [kf.update(*state, m) for state, m in zip(states, measurements)]
+    return np.array([s[0] for s in states]), np.array([s[1] for s in states])
+
+
+def test_multi_initiate_matches_initiate():
+    kf = KalmanFilter()
+    measurements = _measurements(np.random.RandomState(0), 10)
+    mean, covariance = kf.multi_initiate(measurements)
+    for i, measurement in enumerate(measurements):
+        expected_mean, expected_covariance = kf.initiate(measurement)
+        np.testing.assert_allclose(mean[i], expected_mean)
+        np.testing.assert_allclose(covariance[i], expected_covariance)
+
+
+def test_multi_predict_matches_predict():
+    kf = KalmanFilter()
+    mean, covariance = _states(kf, np.random.RandomState(1), 10)
+    multi_mean, multi_covariance = kf.multi_predict(mean, covariance)
+    for i in range(len(mean)):
+        expected_mean, expected_covariance = kf.predict(mean[i], covariance[i])
+        np.testing.assert_allclose(multi_mean[i], expected_mean)
+        np.testing.assert_allclose(multi_covariance[i], expected_covariance)
+
+
+@pytest.mark.parametrize('confidence', [0., 0.7, 'per state'])
+def test_multi_update_matches_update(confidence):
+    kf = KalmanFilter()
+    rng = np.random.RandomState(2)
+    mean, covariance = kf.multi_predict(*_states(kf, rng, 10))
+    measurements = kf.multi_project(mean, covariance)[0] + rng.normal(0, 2, (10, 4))
+    confidences = rng.uniform(0.3, 0.9, 10) if confidence == 'per state' else np.full(10, confidence)
+    multi_mean, multi_covariance = kf.multi_update(
+        mean, covariance, measurements,
+        confidences if confidence == 'per state' else confidence)
+    for i in range(len(mean)):
+        expected_mean, expected_covariance = kf.update(
+            mean[i], covariance[i], measurements[i], confidences[i])
+        np.testing.assert_allclose(multi_mean[i], expected_mean)
+        np.testing.assert_allclose(multi_covariance[i], expected_covariance, atol=1e-9)
+
+
+def test_multi_gating_distance_matches_gating_distance():
+    kf = KalmanFilter()
+    rng = np.random.RandomState(3)
+    mean, covariance = _states(kf, rng, 10)
+    measurements = _measurements(rng, 7)
+    for only_position in (False, True):
+        distances = kf.multi_gating_distance(mean, covariance, measurements, only_position)
+        for i in range(len(mean)):
+            np.testing.assert_allclose(
+                distances[i], kf.gating_distance(mean[i], covariance[i], measurements, only_position))
+
+
+def test_track_store_matches_per_track_filters():
+    # tracks come and go, so slots are released, reused and the store grows
+    kf = KalmanFilter()
+    rng = np.random.RandomState(4)
+    store = TrackStore(kf, capacity=2)
+    slots, states = [], []
+    for step in range(20):
+        store.predict()
+        states = [kf.predict(*state) for state in states]
+
+        matched = [i for i in range(len(slots)) if rng.rand() < 0.7]
+        if matched:
+            measurements = np.array([kf.project(*states[i])[0] for i in matched])
+            measurements += rng.normal(0, 2, measurements.shape)
+            store.update([slots[i] for i in matched], measurements, 0.5)
+            for i, measurement in zip(matched, measurements):
+                states[i] = kf.update(*states[i], measurement, 0.5)
+
+        deleted = [i for i in range(len(slots)) if rng.rand() < 0.2]
+        store.release([slots[i] for i in deleted])
+        slots = [s for i, s in enumerate(slots) if i not in deleted]
+        states = [s for i, s in enumerate(states) if i not in deleted]
+
+        new = _measurements(rng, rng.randint(0, 4))
+        slots += store.initiate(new).tolist()
+        states += [kf.initiate(m) for m in new]
+
+        assert len(store) == len(slots) and sorted(store.active_slots) == sorted(slots)
+        for slot, (mean, covariance) in zip(slots, states):
+            np.testing.assert_allclose(store.mean[slot], mean)
+            np.testing.assert_allclose(store.covariance[slot], covariance, atol=1e-9)
+    assert store.capacity > 2
@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from strong_sort.sort.linear_assignment import solve_gated_assignment  # noqa: E402
+
+
+def _dense_assignment(cost_matrix, max_distance):
+    # the dense path solve_gated_assignment replaced
+    cost_matrix = cost_matrix.copy()
+    cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
+    rows, cols = linear_sum_assignment(cost_matrix)
+    keep = cost_matrix[rows, cols] <= max_distance
+    return rows[keep], cols[keep]
+
+
+@pytest.mark.parametrize('max_distance', [0.05, 0.2, 0.5, 1.0])
+@pytest.mark.parametrize('shape', [(1, 1), (1, 8), (8, 1), (12, 12), (30, 17), (17, 30), (100, 80)])
+def test_gated_assignment_matches_dense(shape, max_distance):
+    rng = np.random.RandomState(sum(shape))
+    for _ in range(10):
+        cost_matrix = rng.uniform(0, 1, shape)
+        rows, cols = solve_gated_assignment(cost_matrix, max_distance)
+        expected_rows, expected_cols = _dense_assignment(cost_matrix, max_distance)
+        # continuous random costs, so the optimum is unique
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_array_equal(cols, expected_cols)
+
+
+def test_gated_assignment_without_feasible_pairs():
+    rows, cols = solve_gated_assignment(np.ones((5, 3)), 0.5)
+    assert len(rows) == len(cols) == 0
@@ -0,0 +1,77 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from strong_sort.sort import nn_matching  # noqa: E402
+from strong_sort.sort.nn_matching import NearestNeighborDistanceMetric  # noqa: E402
+
+
+class _DictGallery(object):
+    # the per-target sample lists the ring-buffer gallery replaced
+
+    def __init__(self, metric, budget):
+        self._metric = nn_matching._nn_cosine_distance if metric == "cosine" \
+            else nn_matching._nn_euclidean_distance
+        self.budget = budget
+        self.samples = {}
+
+    def partial_fit(self, features, targets, active_targets):
+        for feature, target in zip(features, targets):
+            self.samples.setdefault(target, []).append(feature)
+            if self.budget is not None:
+                self.samples[target] = self.samples[target][-self.budget:]
+        self.samples = {k: self.samples[k] for k in active_targets}
+
+    def distance(self, features, targets):
+        cost_matrix = np.zeros((len(targets), len(features)))
+        for i, target in enumerate(targets):
+            cost_matrix[i, :] = self._metric(self.samples[target], features)
+        return cost_matrix
+
+
+def _run(metric, budget, storage, check, steps=40, dim=32, seed=0):
+    # tracks appear with a feature, get one on some later frames (a few
+    # twice) and are dropped, like the tracker drives the metric
+    rng = np.random.RandomState(seed)
+    gallery = NearestNeighborDistanceMetric(metric, 0.2, budget, storage=storage)
+    reference = _DictGallery(metric, budget)
+    active, next_target = [], 0
+    for _ in range(steps):
+        active = [t for t in active if rng.rand() > 0.1]
+        targets = [t for t in active if rng.rand() < 0.7]
+        for _ in range(rng.randint(0, 4)):
+            active.append(next_target)
+            targets.append(next_target)
+            next_target += 1
+        targets += targets[:rng.randint(0, 2)]
+        features = rng.normal(size=(len(targets), dim)).astype(np.float32)
+        gallery.partial_fit(features, np.array(targets, dtype=int), active)
+        reference.partial_fit(features, targets, active)
+
+        queried = list(active)
+        queries = rng.normal(size=(rng.randint(1, 6), dim)).astype(np.float32)
+        check(gallery.distance(queries, queried), reference.distance(queries, queried))
+        assert sorted(gallery.samples) == sorted(reference.samples)
+        for target, samples in reference.samples.items():
+            assert len(gallery.samples[target]) == len(samples)
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+@pytest.mark.parametrize('budget', [None, 1, 3])
+def test_float32_gallery_matches_dict_gallery(metric, budget):
+    def check(actual, expected):
+        np.testing.assert_allclose(actual, expected, atol=1e-5)
+    _run(metric, budget, 'float32', check)
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+def test_float16_gallery_is_close_to_dict_gallery(metric):
+    def check(actual, expected):
+        np.testing.assert_allclose(actual, expected, atol=2e-3)
+    _run(metric, 3, 'float16', check)
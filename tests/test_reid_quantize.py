@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from strong_sort.deep.reid_quantize import quantize_static  # noqa: E402
+from torchreid.utils.feature_extractor import FeatureExtractor  # noqa: E402
+
+WEIGHTS = ROOT / 'strong_sort' / 'deep' / 'checkpoint' / 'osnet_x0_25_msmt17.pth'
+
+
+def _crops(extractor, n, seed=0):
+    image = cv2.cvtColor(cv2.imread(str(ROOT / 'testing.jpg')), cv2.COLOR_BGR2RGB)
+    height, width = image.shape[:2]
+    rng = np.random.RandomState(seed)
+    crops = []
+    for _ in range(n):
+        h = rng.randint(60, height - 1)
+        w = max(16, int(h * rng.uniform(0.3, 0.6)))
+        x, y = rng.randint(0, width - w), rng.randint(0, height - h)
+        crops.append(extractor.preprocess(extractor.to_pil(image[y:y + h, x:x + w])))
+    return torch.stack(crops)
+
+
+@pytest.mark.skipif(not WEIGHTS.is_file(), reason='osnet_x0_25_msmt17 weights not available')
+def test_static_int8_osnet_agrees_with_float():
+    extractor = FeatureExtractor('osnet_x0_25', str(WEIGHTS), device='cpu', verbose=False)
+    model = extractor.model.eval()
+    images = _crops(extractor, 96)
+    calib, held_out = images[:64], images[64:]
+
+    qmodel = quantize_static(model, calib)
+    with torch.no_grad():
+        cosine = F.cosine_similarity(model(held_out), qmodel(held_out))
+    assert cosine.mean() > 0.95
+    assert cosine.min() > 0.85
+    # the quantized model is what reid_quantize.py saves and backend='int8' loads
+    traced = torch.jit.trace(qmodel, held_out[:1])
+    assert torch.allclose(traced(held_out), qmodel(held_out))
@@ -13,8 +13,6 @@ import sys
 import numpy as np
 from pathlib import Path
 
-import pandas as pd
-from collections import Counter
 from collections import deque
 
 import warnings
@@ -48,7 +46,15 @@ from yolov5.utils.general import (LOGGER, check_img_size, non_max_suppression, s
 from yolov5.utils.torch_utils import select_device, time_sync
 from yolov5.utils.plots import Annotator, colors, save_one_box
 from strong_sort.utils.parser import get_config
-from strong_sort.strong_sort import StrongSORT
+from strong_sort.strong_sort import StrongSORT, build_extractor
+from strong_sort.deep.reid_server import ReIDServer
+from strong_sort.utils.pipeline import Pipeline
+from strong_sort.utils.sharding import ShardedTracker
+from strong_sort.utils.track_writer import TRACK_FORMATS, TrackWriter
+from strong_sort.utils.counting import TrackClassCounter
+from strong_sort.utils.trajectories import TrajectoryStore
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 # remove duplicated stream handler to avoid duplicated logging
 logging.getLogger().removeHandler(logging.getLogger().handlers[0])
@@ -87,6 +93,11 @@ def run(
         dnn=False,  # use OpenCV DNN for ONNX inference
         count=False,  # get counts of every obhects
         draw=False,  # draw object trajectory lines
+        trail_length=64,  # points kept per trajectory
+        draw_overlay=False,  # keep the full trajectories on a persistent overlay
+        pipeline_queue=2,  # frames buffered between pipeline stages, 0 runs the stages in sequence
+        save_format='txt',  # --save-txt output format: txt, npz or parquet
+        tracker_workers=0,  # processes running the trackers of multiple sources, 0 runs them in this process
 
 ):
 
@@ -114,7 +125,6 @@ def run(
     model = DetectMultiBackend(yolo_weights, device=device, dnn=dnn, data=None, fp16=half)
     stride, names, pt = model.stride, model.names, model.pt
     imgsz = check_img_size(imgsz, s=stride)  # check image size
-    trajectory = {}
 
 
     # Dataloader
@@ -132,30 +142,65 @@ def run(
     cfg = get_config()
     cfg.merge_from_file(opt.config_strongsort)
 
-    # Create as many strong sort instances as there are video sources
-    strongsort_list = []
-    for i in range(nr_sources):
-        strongsort_list.append(
-            StrongSORT(
-                strong_sort_weights,
-                device,
-                max_dist=cfg.STRONGSORT.MAX_DIST,
-                max_iou_distance=cfg.STRONGSORT.MAX_IOU_DISTANCE,
-                max_age=cfg.STRONGSORT.MAX_AGE,
-                n_init=cfg.STRONGSORT.N_INIT,
-                nn_budget=cfg.STRONGSORT.NN_BUDGET,
-                mc_lambda=cfg.STRONGSORT.MC_LAMBDA,
-                ema_alpha=cfg.STRONGSORT.EMA_ALPHA,
-
-            )
-        )
+    # With several sources, the StrongSORT instances either live in worker
+    # processes, or share one ReID model and run their updates concurrently
+    # so the server can batch their crops
+    sharded = nr_sources > 1 and tracker_workers > 0
+    reid_server, reid_pool = None, None
+    if nr_sources > 1 and cfg.STRONGSORT.REID_SERVER and not sharded:
+        reid_server = ReIDServer(
+            build_extractor(strong_sort_weights, device, cfg.STRONGSORT.REID_INPUT_SIZES,
+                            cfg.STRONGSORT.REID_NUM_THREADS, cfg.STRONGSORT.REID_OPTIMIZE),
+            max_batch=cfg.STRONGSORT.REID_MAX_BATCH,
+            max_wait_ms=cfg.STRONGSORT.REID_MAX_WAIT_MS)
+        reid_pool = ThreadPoolExecutor(max_workers=nr_sources)
+
+    strongsort_kwargs = dict(
+        max_dist=cfg.STRONGSORT.MAX_DIST,
+        max_iou_distance=cfg.STRONGSORT.MAX_IOU_DISTANCE,
+        max_age=cfg.STRONGSORT.MAX_AGE,
+        n_init=cfg.STRONGSORT.N_INIT,
+        nn_budget=cfg.STRONGSORT.NN_BUDGET,
+        mc_lambda=cfg.STRONGSORT.MC_LAMBDA,
+        ema_alpha=cfg.STRONGSORT.EMA_ALPHA,
+        cmc_method=cfg.STRONGSORT.CMC_METHOD,
+        cmc_budget_ms=cfg.STRONGSORT.CMC_BUDGET_MS,
+        lazy_reid=cfg.STRONGSORT.LAZY_REID,
+        reid_refresh_stride=cfg.STRONGSORT.REID_REFRESH_STRIDE,
+        reid_refresh_change=cfg.STRONGSORT.REID_REFRESH_CHANGE,
+        reid_budget=cfg.STRONGSORT.REID_BUDGET,
+        gallery_storage=cfg.STRONGSORT.GALLERY_STORAGE,
+        pq_subspaces=cfg.STRONGSORT.PQ_SUBSPACES,
+        pq_train_size=cfg.STRONGSORT.PQ_TRAIN_SIZE,
+        reid_input_sizes=cfg.STRONGSORT.REID_INPUT_SIZES,
+        reid_num_threads=cfg.STRONGSORT.REID_NUM_THREADS,
+        reid_optimize=cfg.STRONGSORT.REID_OPTIMIZE,
+    )
+    if sharded:
+        sharded_tracker = ShardedTracker(
+            partial(StrongSORT, strong_sort_weights, device, **strongsort_kwargs),
+            nr_sources, workers=tracker_workers, max_det=max_det,
+            ecc=cfg.STRONGSORT.CMC_METHOD != 'none')
+        strongsort_list = []
+    else:
+        # Create as many strong sort instances as there are video sources
+        strongsort_list = [StrongSORT(strong_sort_weights, device, extractor=reid_server, **strongsort_kwargs)
+                           for _ in range(nr_sources)]
     outputs = [None] * nr_sources
+    trajectories = [TrajectoryStore(maxlen=trail_length, max_age=cfg.STRONGSORT.MAX_AGE, persistent=draw_overlay)
+                    for _ in range(nr_sources)]
+
+    track_writer = TrackWriter(save_dir / 'tracks', fmt=save_format) if save_txt else None
+    counters = {}  # per-source track counts per class for --count
 
     # Run tracking
     model.warmup(imgsz=(1 if pt else nr_sources, 3, *imgsz))  # warmup
     dt, seen = [0.0, 0.0, 0.0, 0.0], 0
-    curr_frames, prev_frames = [None] * nr_sources, [None] * nr_sources
-    for frame_idx, (path, im, im0s, vid_cap, s) in enumerate(dataset):
+    prev_frames = [None] * nr_sources
+
+    @torch.no_grad()  # grad mode is per thread
+    def detect(item):
+        frame_idx, (path, im, im0s, vid_cap, s) = item
         t1 = time_sync()
         im = torch.from_numpy(im).to(device)
         im = im.half() if half else im.float()  # uint8 to fp16/32
@@ -167,149 +212,146 @@ def run(
         dt[0] += t2 - t1
 
         # Inference
-        visualize = increment_path(save_dir / Path(path[0]).stem, mkdir=True) if visualize else False
-        pred = model(im, augment=augment, visualize=visualize)
+        vis = increment_path(save_dir / Path(path[0]).stem, mkdir=True) if visualize else False
+        pred = model(im, augment=augment, visualize=vis)
         t3 = time_sync()
         dt[1] += t3 - t2
 
         # Apply NMS
         pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
         dt[2] += time_sync() - t3
-
-        # Process detections
-        for i, det in enumerate(pred):  # detections per image
-            seen += 1
-            if webcam:  # nr_sources >= 1
-                p, im0, _ = path[i], im0s[i].copy(), dataset.count
-                p = Path(p)  # to Path
-                s += f'{i}: '
-                txt_file_name = p.name
-                save_path = str(save_dir / p.name)  # im.jpg, vid.mp4, ...
+        return frame_idx, path, im, im0s, vid_cap, s, pred, t3 - t2
+
+    @torch.no_grad()
+    def track(item):
+        frame_idx, path, im, im0s, vid_cap, s, pred, t_yolo = item
+        frames = im0s if webcam else [im0s]
+        t4 = time_sync()
+        if sharded:
+            dets = []
+            for i, det in enumerate(pred):
+                if det is not None and len(det):
+                    det[:, :4] = scale_coords(im.shape[2:], det[:, :4], frames[i].shape).round()
+                    dets.append(torch.cat((xyxy2xywh(det[:, 0:4]), det[:, 4:6]), 1).cpu().numpy())
+                else:
+                    dets.append(None)
+            outputs = sharded_tracker.update(frames, dets)
+            deleted = list(sharded_tracker.deleted_tracks)
+            t5 = time_sync()
+            dt[3] += t5 - t4
+            return frame_idx, path, im, im0s, vid_cap, s, pred, outputs, deleted, t_yolo, t5 - t4
+
+        # Start all trackers at once so that the ReID server batches their crops
+        outputs, tracking = [None] * nr_sources, [None] * nr_sources
+        for i, det in enumerate(pred):
+            im0 = frames[i]
+            if cfg.STRONGSORT.CMC_METHOD != 'none':  # camera motion compensation
+                strongsort_list[i].tracker.camera_update(prev_frames[i], im0)
+            if det is not None and len(det):
+                # Rescale boxes from img_size to im0 size
+                det[:, :4] = scale_coords(im.shape[2:], det[:, :4], im0.shape).round()
+                # pass detections to strongsort
+                args = (xyxy2xywh(det[:, 0:4]).cpu(), det[:, 4].cpu(), det[:, 5].cpu(), im0)
+                if reid_pool is not None:
+                    tracking[i] = reid_pool.submit(strongsort_list[i].update, *args)
+                else:
+                    outputs[i] = strongsort_list[i].update(*args)
             else:
-                p, im0, _ = path, im0s.copy(), getattr(dataset, 'frame', 0)
-                p = Path(p)  # to Path
-                # video file
-                if source.endswith(VID_FORMATS):
-                    txt_file_name = p.stem
+                strongsort_list[i].increment_ages()
+            prev_frames[i] = im0
+        for i, future in enumerate(tracking):
+            if future is not None:
+                outputs[i] = future.result()
+        # read here, the trackers may already be on the next frame when this one is drawn
+        deleted = [strongsort.tracker.deleted_tracks for strongsort in strongsort_list]
+        t5 = time_sync()
+        dt[3] += t5 - t4
+        return frame_idx, path, im, im0s, vid_cap, s, pred, outputs, deleted, t_yolo, t5 - t4
+
+    # Reading, detection and tracking run on their own threads, each handing
+    # frames to the next through a bounded queue; drawing and writing stay here
+    pipeline = Pipeline(enumerate(dataset), [('detect', detect), ('track', track)], queue_size=pipeline_queue)
+    try:
+        for frame_idx, path, im, im0s, vid_cap, s, pred, outputs, deleted, t_yolo, t_sort in pipeline:
+            # Process detections
+            for i, det in enumerate(pred):  # detections per image
+                seen += 1
+                if webcam:  # nr_sources >= 1
+                    p, im0, _ = path[i], im0s[i].copy(), dataset.count
+                    p = Path(p)  # to Path
+                    s += f'{i}: '
+                    txt_file_name = p.name
                     save_path = str(save_dir / p.name)  # im.jpg, vid.mp4, ...
-                # folder with imgs
                 else:
-                    txt_file_name = p.parent.name  # get folder name containing current img
-                    save_path = str(save_dir / p.parent.name)  # im.jpg, vid.mp4, ...
-            curr_frames[i] = im0
+                    p, im0, _ = path, im0s.copy(), getattr(dataset, 'frame', 0)
+                    p = Path(p)  # to Path
+                    # video file
+                    if source.endswith(VID_FORMATS):
+                        txt_file_name = p.stem
+                        save_path = str(save_dir / p.name)  # im.jpg, vid.mp4, ...
+                    # folder with imgs
+                    else:
+                        txt_file_name = p.parent.name  # get folder name containing current img
+                        save_path = str(save_dir / p.parent.name)  # im.jpg, vid.mp4, ...
+
+                txt_path = str(save_dir / 'tracks' / txt_file_name)  # im.txt
+                counter = counters.setdefault(txt_file_name, TrackClassCounter()) if count else None
+                s += '%gx%g ' % im.shape[2:]  # print string
+                imc = im0.copy() if save_crop else im0  # for save_crop
+
+                annotator = Annotator(im0, line_width=2, pil=not ascii)
+                if save_txt:
+                    # Write MOT compliant results to file, on every frame so the writer
+                    # counts frames for its periodic flush
+                    track_writer.write(txt_file_name, frame_idx + 1,
+                                       outputs[i] if det is not None and len(det) else [])
+                if draw:
+                    # object trajectories
+                    trajectories[i].update(outputs[i] if det is not None and len(det) else [])
+                    trajectories[i].evict(deleted[i])
+                    trajectories[i].draw(im0)
+
+                if det is not None and len(det):
+                    # Print results
+                    for c in det[:, -1].unique():
+                        n = (det[:, -1] == c).sum()  # detections per class
+                        s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "  # add to string
+
+                    confs = det[:, 4]
+
+                    if count:
+                        counter.update(outputs[i])
+
+                    # draw boxes for visualization
+                    if len(outputs[i]) > 0:
+                        for j, (output, conf) in enumerate(zip(outputs[i], confs)):
+    
+                            bboxes = output[0:4]
+                            id = output[4]
+                            cls = output[5]
+                            bbox_left, bbox_top, bbox_right, bbox_bottom = bboxes
+                        
 
-            txt_path = str(save_dir / 'tracks' / txt_file_name)  # im.txt
-            s += '%gx%g ' % im.shape[2:]  # print string
-            imc = im0.copy() if save_crop else im0  # for save_crop
+                            if save_vid or save_crop or show_vid:  # Add bbox to image
+                                c = int(cls)  # integer class
+                                id = int(id)  # integer id
+                                label = None if hide_labels else (f'{id} {names[c]}' if hide_conf else \
+                                    (f'{id} {conf:.2f}' if hide_class else f'{id} {names[c]} {conf:.2f}'))
+                                annotator.box_label(bboxes, label, color=colors(c, True))
 
-            annotator = Annotator(im0, line_width=2, pil=not ascii)
-            if cfg.STRONGSORT.ECC:  # camera motion compensation
-                strongsort_list[i].tracker.camera_update(prev_frames[i], curr_frames[i])
 
-            if det is not None and len(det):
-                # Rescale boxes from img_size to im0 size
-                det[:, :4] = scale_coords(im.shape[2:], det[:, :4], im0.shape).round()
+                                if save_crop:
+                                    txt_file_name = txt_file_name if (isinstance(path, list) and len(path) > 1) else ''
+                                    save_one_box(bboxes, imc, file=save_dir / 'crops' / txt_file_name / names[c] / f'{id}' / f'{p.stem}.jpg', BGR=True)
 
-                # Print results
-                for c in det[:, -1].unique():
-                    n = (det[:, -1] == c).sum()  # detections per class
-                    s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "  # add to string
+                    LOGGER.info(f'{s}Done. YOLO:({t_yolo:.3f}s), StrongSORT:({t_sort:.3f}s)')
 
-                xywhs = xyxy2xywh(det[:, 0:4])
-                confs = det[:, 4]
-                clss = det[:, 5]
-
-                # pass detections to strongsort
-                t4 = time_sync()
-                outputs[i] = strongsort_list[i].update(xywhs.cpu(), confs.cpu(), clss.cpu(), im0)
-                t5 = time_sync()
-                dt[3] += t5 - t4
-
-                # draw boxes for visualization
-                if len(outputs[i]) > 0:
-                    for j, (output, conf) in enumerate(zip(outputs[i], confs)):
-    
-                        bboxes = output[0:4]
-                        id = output[4]
-                        cls = output[5]
-                        bbox_left, bbox_top, bbox_right, bbox_bottom = bboxes
-                        
-                        if draw:
-                            # object trajectory
-                            center = ((int(bboxes[0]) + int(bboxes[2])) // 2,(int(bboxes[1]) + int(bboxes[3])) // 2)
-                            if id not in trajectory:
-                                trajectory[id] = []
-                            trajectory[id].append(center)
-                            for i1 in range(1,len(trajectory[id])):
-                                if trajectory[id][i1-1] is None or trajectory[id][i1] is None:
-                                    continue
-                                # thickness = int(np.sqrt(1000/float(i1+10))*0.3)
-                                thickness = 2
-                                try:
-                                  cv2.line(im0, trajectory[id][i1 - 1], trajectory[id][i1], (0, 0, 255), thickness)
-                                except:
-                                  pass
-
-
-                        if save_txt:
-                            # to MOT format
-                            bbox_left = output[0]
-                            bbox_top = output[1]
-                            bbox_w = output[2] - output[0]
-                            bbox_h = output[3] - output[1]
-                            # Write MOT compliant results to file
-                            with open(txt_path+'.txt', 'a') as f:
-                                f.write(('%g ' * 11 + '\n') % (frame_idx + 1, cls, id, bbox_left,  # MOT format
-                                                               bbox_top, bbox_w, bbox_h, -1, -1, -1, -1))
-
-                        if save_vid or save_crop or show_vid:  # Add bbox to image
-                            c = int(cls)  # integer class
-                            id = int(id)  # integer id
-                            label = None if hide_labels else (f'{id} {names[c]}' if hide_conf else \
-                                (f'{id} {conf:.2f}' if hide_class else f'{id} {names[c]} {conf:.2f}'))
-                            annotator.box_label(bboxes, label, color=colors(c, True))
-
-
-                            if save_crop:
-                                txt_file_name = txt_file_name if (isinstance(path, list) and len(path) > 1) else ''
-                                save_one_box(bboxes, imc, file=save_dir / 'crops' / txt_file_name / names[c] / f'{id}' / f'{p.stem}.jpg', BGR=True)
-
-                LOGGER.info(f'{s}Done. YOLO:({t3 - t2:.3f}s), StrongSORT:({t5 - t4:.3f}s)')
+                else:
+                    LOGGER.info('No detections')
 
-            else:
-                strongsort_list[i].increment_ages()
-                LOGGER.info('No detections')
-
-
-            if count:
-                itemDict={}
-                ## NOTE: this works only if save-txt is true
-                try:
-                    df = pd.read_csv(txt_path +'.txt' , header=None, delim_whitespace=True)
-                    df = df.iloc[:,0:3]
-                    df.columns=["frameid" ,"class","trackid"]
-                    df = df[['class','trackid']]
-                    df = (df.groupby('trackid')['class']
-                              .apply(list)
-                              .apply(lambda x:sorted(x))
-                             ).reset_index()
-
-                    df.colums = ["trackid","class"]
-                    df['class']=df['class'].apply(lambda x: Counter(x).most_common(1)[0][0])
-                    vc = df['class'].value_counts()
-                    vc = dict(vc)
-
-                    vc2 = {}
-                    for key, val in enumerate(names):
-                        vc2[key] = val
-                    itemDict = dict((vc2[key], value) for (key, value) in vc.items())
-                    itemDict  = dict(sorted(itemDict.items(), key=lambda item: item[0]))
-                    # print(itemDict)
-
-                except:
-                    pass
 
-                if save_txt:
+                if count:
+                    itemDict = counter.counts(names)
                     ## overlay
                     display = im0.copy()
                     h, w = im0.shape[0], im0.shape[1]
@@ -324,38 +366,64 @@ def run(
                     cv2.addWeighted(im0, 0.7, display, 1 - 0.7, 0, im0)
 
 
-            #current frame // tesing
-            cv2.imwrite('testing.jpg',im0)
-
-
-            if show_vid:
-                cv2.imshow(str(p), im0)
-                if cv2.waitKey(1) == ord('q'):  # q to quit
-                    break
-
-            # Save results (image with detections)
-            if save_vid:
-                if vid_path[i] != save_path:  # new video
-                    vid_path[i] = save_path
-                    if isinstance(vid_writer[i], cv2.VideoWriter):
-                        vid_writer[i].release()  # release previous video writer
-                    if vid_cap:  # video
-                        fps = vid_cap.get(cv2.CAP_PROP_FPS)
-                        w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                        h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                    else:  # stream
-                        fps, w, h = 30, im0.shape[1], im0.shape[0]
-                    save_path = str(Path(save_path).with_suffix('.mp4'))  # force *.mp4 suffix on results videos
-                    vid_writer[i] = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
-                vid_writer[i].write(im0)
-
-            prev_frames[i] = curr_frames[i]
+                #current frame // tesing
+                cv2.imwrite('testing.jpg',im0)
+
+
+                if show_vid:
+                    cv2.imshow(str(p), im0)
+                    if cv2.waitKey(1) == ord('q'):  # q to quit
+                        break
+
+                # Save results (image with detections)
+                if save_vid:
+                    if vid_path[i] != save_path:  # new video
+                        vid_path[i] = save_path
+                        if isinstance(vid_writer[i], cv2.VideoWriter):
+                            vid_writer[i].release()  # release previous video writer
+                        if vid_cap:  # video
+                            fps = vid_cap.get(cv2.CAP_PROP_FPS)
+                            w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                            h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                        else:  # stream
+                            fps, w, h = 30, im0.shape[1], im0.shape[0]
+                        save_path = str(Path(save_path).with_suffix('.mp4'))  # force *.mp4 suffix on results videos
+                        vid_writer[i] = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+                    vid_writer[i].write(im0)
+
+    finally:
+        # also on errors and interrupts, so written tracks and counts are not lost
+        # and no worker processes or shared memory blocks are left behind
+        pipeline.close()
+        if sharded:
+            sharded_tracker.close()
+        if track_writer is not None:
+            nr_tracks = len(track_writer.sinks)
+            track_writer.close()
+        for name, counter in counters.items():
+            counter.save(save_dir / 'counts' / f'{name}.json')
+        if reid_server is not None:
+            reid_pool.shutdown()
+            reid_server.close()
+            reid_server.extractor.close()
+        else:
+            for strongsort in strongsort_list:
+                strongsort.extractor.close()
+
+    for stage, stats in pipeline.stats().items():
+        LOGGER.info(f"Pipeline {stage}: {stats['count']} frames, {stats['mean_ms']:.1f}ms mean, "
+                    f"{stats['max_ms']:.1f}ms max, max queue depth {stats['max_queue_depth']}")
+    if reid_server is not None:
+        LOGGER.info(f'ReID server: {reid_server.requests} requests in {reid_server.batches} batches')
+    if not sharded:
+        storages = sorted({strongsort.tracker.metric.active_storage for strongsort in strongsort_list})
+        LOGGER.info(f"Appearance gallery storage: {', '.join(storages)}")
 
     # Print results
     t = tuple(x / seen * 1E3 for x in dt)  # speeds per image
     LOGGER.info(f'Speed: %.1fms pre-process, %.1fms inference, %.1fms NMS, %.1fms strong sort update per image at shape {(1, 3, *imgsz)}' % t)
     if save_txt or save_vid:
-        s = f"\n{len(list(save_dir.glob('tracks/*.txt')))} tracks saved to {save_dir / 'tracks'}" if save_txt else ''
+        s = f"\n{nr_tracks} tracks saved to {save_dir / 'tracks'}" if save_txt else ''
         LOGGER.info(f"Results saved to {colorstr('bold', save_dir)}{s}")
     if update:
         strip_optimizer(yolo_weights)  # update model (to fix SourceChangeWarning)
@@ -374,12 +442,17 @@ def parse_opt():
     parser.add_argument('--device', default='', help='cuda device, i.e. 0 or 0,1,2,3 or cpu')
     parser.add_argument('--show-vid', action='store_true', help='display tracking video results')
     parser.add_argument('--save-txt', action='store_true', help='save results to *.txt')
+    parser.add_argument('--save-format', type=str, default='txt', choices=TRACK_FORMATS, help='--save-txt output format')
     parser.add_argument('--save-conf', action='store_true', help='save confidences in --save-txt labels')
     parser.add_argument('--save-crop', action='store_true', help='save cropped prediction boxes')
     parser.add_argument('--save-vid', action='store_true', help='save video tracking results')
     parser.add_argument('--nosave', action='store_true', help='do not save images/videos')
     parser.add_argument('--count', action='store_true', help='display all MOT counts results on screen')
     parser.add_argument('--draw', action='store_true', help='display object trajectory lines')
+    parser.add_argument('--trail-length', type=int, default=64, help='points kept per trajectory')
+    parser.add_argument('--draw-overlay', action='store_true', help='keep full trajectories on a persistent overlay')
+    parser.add_argument('--tracker-workers', type=int, default=0, help='processes running the trackers of multiple sources')
+    parser.add_argument('--pipeline-queue', type=int, default=2, help='frames buffered between pipeline stages, 0 to disable')
     # class 0 is person, 1 is bycicle, 2 is car... 79 is oven
     parser.add_argument('--classes', nargs='+', type=int, help='filter by class: --classes 0, or --classes 0 2 3')
     parser.add_argument('--agnostic-nms', action='store_true', help='class-agnostic NMS')
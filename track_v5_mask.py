@@ -162,6 +162,18 @@ def run(
                 nn_budget=cfg.STRONGSORT.NN_BUDGET,
                 mc_lambda=cfg.STRONGSORT.MC_LAMBDA,
                 ema_alpha=cfg.STRONGSORT.EMA_ALPHA,
+                cmc_method=cfg.STRONGSORT.CMC_METHOD,
+                cmc_budget_ms=cfg.STRONGSORT.CMC_BUDGET_MS,
+                lazy_reid=cfg.STRONGSORT.LAZY_REID,
+                reid_refresh_stride=cfg.STRONGSORT.REID_REFRESH_STRIDE,
+                reid_refresh_change=cfg.STRONGSORT.REID_REFRESH_CHANGE,
+                reid_budget=cfg.STRONGSORT.REID_BUDGET,
+                gallery_storage=cfg.STRONGSORT.GALLERY_STORAGE,
+                pq_subspaces=cfg.STRONGSORT.PQ_SUBSPACES,
+                pq_train_size=cfg.STRONGSORT.PQ_TRAIN_SIZE,
+                reid_input_sizes=cfg.STRONGSORT.REID_INPUT_SIZES,
+                reid_num_threads=cfg.STRONGSORT.REID_NUM_THREADS,
+                reid_optimize=cfg.STRONGSORT.REID_OPTIMIZE,
             )
         )
     outputs = [None] * nr_sources
@@ -218,7 +230,7 @@ def run(
             imc = im0.copy() if save_crop else im0  # for save_crop
 
             annotator = Annotator(im0, line_width=2, pil=not ascii)
-            if cfg.STRONGSORT.ECC:  # camera motion compensation
+            if cfg.STRONGSORT.CMC_METHOD != 'none':  # camera motion compensation
                 strongsort_list[i].tracker.camera_update(prev_frames[i], curr_frames[i])
 
             if det is not None and len(det):
@@ -133,6 +133,18 @@ def detect(save_img=False, line_thickness=1):
                 nn_budget=cfg.STRONGSORT.NN_BUDGET,
                 mc_lambda=cfg.STRONGSORT.MC_LAMBDA,
                 ema_alpha=cfg.STRONGSORT.EMA_ALPHA,
+                cmc_method=cfg.STRONGSORT.CMC_METHOD,
+                cmc_budget_ms=cfg.STRONGSORT.CMC_BUDGET_MS,
+                lazy_reid=cfg.STRONGSORT.LAZY_REID,
+                reid_refresh_stride=cfg.STRONGSORT.REID_REFRESH_STRIDE,
+                reid_refresh_change=cfg.STRONGSORT.REID_REFRESH_CHANGE,
+                reid_budget=cfg.STRONGSORT.REID_BUDGET,
+                gallery_storage=cfg.STRONGSORT.GALLERY_STORAGE,
+                pq_subspaces=cfg.STRONGSORT.PQ_SUBSPACES,
+                pq_train_size=cfg.STRONGSORT.PQ_TRAIN_SIZE,
+                reid_input_sizes=cfg.STRONGSORT.REID_INPUT_SIZES,
+                reid_num_threads=cfg.STRONGSORT.REID_NUM_THREADS,
+                reid_optimize=cfg.STRONGSORT.REID_OPTIMIZE,
 
             )
         )
@@ -194,7 +206,7 @@ def detect(save_img=False, line_thickness=1):
 
             s += '%gx%g ' % img.shape[2:]  # print string
             imc = im0.copy() if save_crop else im0  # for save_crop
-            if cfg.STRONGSORT.ECC:  # camera motion compensation
+            if cfg.STRONGSORT.CMC_METHOD != 'none':  # camera motion compensation
                 strongsort_list[i].tracker.camera_update(prev_frames[i], curr_frames[i])
 
             gn = torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
@@ -6,11 +6,12 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 import time
-from collections import Counter, deque
-import pandas as pd
+from collections import deque
 import argparse
 from multiprocessing import Pool
 
+from strong_sort.utils.counting import TrackClassCounter
+
 # Load a model
 model = YOLO('yolov8n-seg.pt')  # load an official model
 model.overrides['conf'] = 0.3  # NMS confidence threshold
@@ -24,6 +25,7 @@ colors = np.random.randint(0, 255, size=(80, 3), dtype='uint8')
 
 
 tracking_trajectories = {}
+track_counter = TrackClassCounter()
 def process(image, track=True):
     global input_video_name
     bboxes = []
@@ -96,6 +98,7 @@ def process(image, track=True):
             line = f'{frameId} {int(classes)} {int(id_[0])} {round(float(scores), 3)} {int(bbox_coords[0])} {int(bbox_coords[1])} {int(bbox_coords[2])} {int(bbox_coords[3])} -1 -1 -1 -1\n'
             # print(line)
             file.write(line)
+            track_counter.observe(int(id_[0]), int(classes))
 
 
     if not track:
@@ -145,7 +148,8 @@ def process_video(args):
     count_ = args['count']
 
 
-    global input_video_name
+    global input_video_name, track_counter
+    track_counter = TrackClassCounter()
     cap = cv2.VideoCapture(int(source) if source == '0' else source)
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -178,31 +182,7 @@ def process_video(args):
             break
 
         if track_ and count_:
-            itemDict={}
-            ## NOTE: this works only if save-txt is true
-            try:
-                df = pd.read_csv('output/'+input_video_name+'_labels.txt' , header=None, delim_whitespace=True)
-                # print(df)
-                df = df.iloc[:,0:3]
-                df.columns=["frameid" ,"class","trackid"]
-                df = df[['class','trackid']]
-                df = (df.groupby('trackid')['class']
-                          .apply(list)
-                          .apply(lambda x:sorted(x))
-                         ).reset_index()
-                df['class']=df['class'].apply(lambda x: Counter(x).most_common(1)[0][0])
-                vc = df['class'].value_counts()
-                vc = dict(vc)
-
-                vc2 = {}
-                for key, val in enumerate(names):
-                    vc2[key] = val
-                itemDict = dict((vc2[key], value) for (key, value) in vc.items())
-                itemDict  = dict(sorted(itemDict.items(), key=lambda item: item[0]))
-                # print(itemDict)
-
-            except:
-                pass
+            itemDict = track_counter.counts(dict(enumerate(names)))
 
             ## overlay
             display = frame.copy()
@@ -229,6 +209,9 @@ def process_video(args):
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
+    if count_:
+        track_counter.save(f'output/{input_video_name}_counts.json')
+
     # Release the video capture and writer
     cap.release()
     out.release()